@@ -1,25 +1,26 @@
-import sys
-import subprocess
-import pkg_resources
-
-required = {'streamlit', 'pandas', 'xlsxwriter'}
-installed = {pkg.key for pkg in pkg_resources.working_set}
-missing = required - installed
-
-if missing:
-    python = sys.executable
-    subprocess.check_call([python, '-m', 'pip', 'install', *missing], stdout=subprocess.DEVNULL)
-# else:
-    # print("All required packages are available!")
+import os
+import tempfile
 
 import streamlit as st
-import pandas as pd
-import numpy as np
-import xlsxwriter
-from io import BytesIO
 
 
 from miscellaneous import *
+from engine import summarise, increased_payment_warnings, schedule_columns, schedule_frame, yearly_frame
+from cache import schedule_cache
+from schedules import RecurringRepayments
+from export import schedule_blocks, write_workbook, WRITERS
+from solver import solve_overpayment
+from diagnostics import Diagnostics, diagnostics_enabled, memory_tracing_enabled
+from conventions import PaymentConvention, MONTHLY, payment_convention
+from plans import PlanRows, ONE_OFF_COLUMNS, RECURRING_COLUMNS, number, one_off_repayments, recurring_repayments, parse_plan
+
+EXPORTS = {"Excel":("xlsx", 'application/vnd.ms-excel'),
+           "CSV":("csv", 'text/csv'),
+           "Parquet":("parquet", 'application/vnd.apache.parquet')}
+
+FREQUENCIES = {"Monthly":'monthly', "Fortnightly":'fortnightly', "Weekly":'weekly', "Daily":'daily'}
+ACCRUALS = {"Per instalment":'periodic', "Daily":'daily', "Daily, compounded":'daily_compound'}
+PAGE_SIZE = 500
 
 def remote(url):
     st.markdown(f'<link href="{url}" rel="stylesheet">', unsafe_allow_html=True)
@@ -30,7 +31,35 @@ def local(file_name):
 
 
 
-def calculate(mortgage_amount:int, interest_rate:float, mortgage_period:int, total_instalments:int, currency:str, repayments_oop:dict={}, repayments_mop:dict={})->pd.DataFrame():
+def warn_increased_payments(monthly_payment:float, instalment:int, currency:str, repayments_mop:dict={}):
+    """Reports the increased payments, up to the last instalment, that are lower than the original payment"""
+    ## MONTLY REPAYMENTS
+    for warning in increased_payment_warnings(monthly_payment, instalment, repayments_mop):
+        st.write(f"ERROR: {warning.describe(currency)}")
+
+def schedule_table(mortgage_amount:int, interest_rate:float, mortgage_period:int, total_instalments:int, repayments_oop:dict={}, repayments_mop:dict={}, convention:PaymentConvention=MONTHLY, yearly:bool=False)->tuple:
+    """Builds the table with all the instalments (or their yearly totals), once, from the columns computed by the engine (money as float64, flags as bool)"""
+    schedule, instalment, payment_to_date = schedule_cache.amortize(mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, repayments_mop, convention)
+    columns = schedule_columns(repayments_oop, repayments_mop)
+    if yearly:
+        table = yearly_frame(schedule, instalment, columns, convention.periods_per_year)
+    else:
+        table = schedule_frame(schedule, instalment, columns)
+    return table, instalment, payment_to_date
+
+def time_saved(instalments:int, convention:PaymentConvention=MONTHLY)->str:
+    """Describes how much earlier the mortgage is paid off"""
+    if convention.frequency == 'monthly':
+        return f"{instalments//12} year(s) and {instalments % 12} months"
+    return f"{instalments/convention.periods_per_year:.1f} year(s), {instalments} {convention.frequency} instalments,"
+
+def style_table(table, currency:str):
+    """Formats the money columns for display only, the table itself stays numeric"""
+    money = [column for column in table.columns if table[column].dtype != bool]
+    flags = [column for column in table.columns if table[column].dtype == bool]
+    return table.style.format(f"{currency}{{:,.2f}}", subset=money).format(lambda flag: "Y" if flag else "", subset=flags)
+
+def calculate(mortgage_amount:int, interest_rate:float, mortgage_period:int, total_instalments:int, currency:str, repayments_oop:dict={}, repayments_mop:dict={}, convention:PaymentConvention=MONTHLY)->tuple:
     """
     Calculates all the instalments
 
@@ -44,6 +73,8 @@ def calculate(mortgage_amount:int, interest_rate:float, mortgage_period:int, tot
         Lenght of mortgage in years.
     total_instalments : int
         Number of repayments (typically months).
+    convention : PaymentConvention
+        Payment frequency and interest accrual.
 
     Returns
     -------
@@ -51,69 +82,25 @@ def calculate(mortgage_amount:int, interest_rate:float, mortgage_period:int, tot
         Full table with all details.
 
     """
-    monthly_payment = payments(mortgage_amount,interest_rate,mortgage_period)
-    columns=['Principal to date','Payment','Paid to date','Interest charged', 'Interest charged to date', 'Principal repaid', 'Principal repaid to date', 'Remaining principal','One-off','Increased']
-    table = pd.DataFrame(columns=columns, index=[x for x in range(1, total_instalments+1)])
-    remaining_principal = mortgage_amount
-    payment_to_date = 0
-    interest_paid_to_date = 0
-    principal_repaid_to_date = 0
-    to_break = False
-    for instalment in range(1, total_instalments+1):
-        this_month_payment = monthly_payment
-        
-        ## MONTLY REPAYMENTS
-        increased_payment = False
-        if instalment in repayments_mop:
-            increased_payment = True
-            this_month_payment = repayments_mop[instalment]
-            if this_month_payment < monthly_payment:
-                st.write(f"ERROR: For month {instalment} your repayment is set to {currency}{clean(this_month_payment)} instead of the original {currency}{clean(monthly_payment)}")
-        
-
-        ## ONE OFF PAYMENT
-        one_off_repayment = False
-        if instalment in repayments_oop:
-            one_off_repayment = True
-            this_month_payment += repayments_oop[instalment]
-        
-
-        principal_to_date = remaining_principal  
-        curr_interest_paid = current_interest_paid(principal_to_date, interest_rate)
-        if principal_to_date <= this_month_payment:
-            this_month_payment = principal_to_date + curr_interest_paid
-            to_break = True
-        
-        payment_to_date += this_month_payment
-        
-        interest_paid_to_date += curr_interest_paid
-        principal_repaid = this_month_payment - curr_interest_paid
-        principal_repaid_to_date += principal_repaid
-        remaining_principal -= principal_repaid
-        table.loc[instalment] = pd.Series({columns[0]:clean(principal_to_date),
-                                             columns[1]:clean(this_month_payment),
-                                             columns[2]:clean(payment_to_date),
-                                             columns[3]:clean(curr_interest_paid),
-                                             columns[4]:clean(interest_paid_to_date),
-                                             columns[5]:clean(principal_repaid),
-                                             columns[6]:clean(principal_repaid_to_date),
-                                             columns[7]:clean(remaining_principal),
-                                             columns[8]:"Y" if one_off_repayment else "",
-                                             columns[9]:"Y" if increased_payment else "",
-                                             })
-        
-        if to_break:
-            table = table.drop(range(instalment+1, total_instalments+1))
-            break
-        
-    if len(repayments_oop) == 0:
-        table = table.drop(['One-off'],axis=1)
-    
-    if len(repayments_mop) == 0:
-        table = table.drop(['Increased'],axis=1)
-            
+    monthly_payment = convention.payment(mortgage_amount,interest_rate,mortgage_period)
+    table, instalment, payment_to_date = schedule_table(mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, repayments_mop, convention)
+    warn_increased_payments(monthly_payment, instalment, currency, repayments_mop)
     return table, instalment, payment_to_date
 
+def diagnostics_panel(diagnostics:Diagnostics):
+    """Shows the time, rows and peak memory of each stage of the run in the sidebar"""
+    import pandas as pd
+    with st.sidebar.expander("Diagnostics", expanded=True):
+        stages = pd.DataFrame(diagnostics.stages, columns=['stage', 'depth', 'rows', 'seconds', 'peak_bytes'])
+        stages['stage'] = ["  "*depth + stage for stage, depth in zip(stages['stage'], stages['depth'])]
+        stages['ms'] = stages.pop('seconds')*1000
+        peak_bytes = stages.pop('peak_bytes')
+        if diagnostics.memory:
+            stages['peak KiB'] = pd.to_numeric(peak_bytes)/1024
+        st.dataframe(stages.drop(columns='depth'), hide_index=True)
+        st.write(f"Run {diagnostics.run}: {diagnostics.total()*1000:,.1f} ms in total.")
+        st.write("Schedule cache: " + ", ".join(f"{key} {value}" for key, value in schedule_cache.stats().items()))
+
 def card(description, value="", color="#f0f2f6"):
     st.html(f"""<div class="card text-center mb-3" style="background-color: {color};">
           <div class="card-body">
@@ -132,6 +119,13 @@ def cardb(description, color="#f0f2f6"):
         """)
 
 def main():
+    diagnostics = Diagnostics(diagnostics_enabled(os.environ, st.query_params), memory_tracing_enabled(os.environ), page='calculator')
+    try:
+        calculator(diagnostics)
+    finally:
+        diagnostics.close()
+
+def calculator(diagnostics:Diagnostics):
     ### WEBAPP
     local('assets/css/bootstrap.min.css')
     
@@ -157,32 +151,37 @@ def main():
             
         interest_rate   = st.text_input("Interest Rate (%)", "3.4")
         mortgage_period = st.text_input("Mortgage Period (in years)", "30")
+        frequency = st.selectbox("Payment frequency", tuple(FREQUENCIES))
+        accrual = st.selectbox("Interest accrual", tuple(ACCRUALS))
+        if frequency != "Monthly":
+            st.write("Overpayment months are then counted in instalments.")
         st.divider()
         
         
+        # the rows are kept as lists, a DataFrame is only built to show them
+        if 'dataop' not in st.session_state:
+            st.session_state.dataop = PlanRows(ONE_OFF_COLUMNS)
+        if 'datamop' not in st.session_state:
+            st.session_state.datamop = PlanRows(RECURRING_COLUMNS)
+        
+        
         #########################
         ###### OVERPAYMENTS - OOP
         #########################
-        over_toggle = st.toggle("One-off lump sum overpayments?")
+        over_toggle = st.toggle("One-off lump sum overpayments?", key='over_toggle')
         # inspired from https://mathcatsand-examples.streamlit.app/add_data#not-using-form-submission
         if over_toggle:
             st.title('One-off Overpayment')
             
-            if 'dataop' not in st.session_state:
-                dataop = pd.DataFrame({'Payment':[],'Month':[]})
-                st.session_state.dataop = dataop
-            
             st.write("This table describes all the one-off lump sum overpayments made on a certain month.")
-            st.session_state.dataop = st.data_editor(st.session_state.dataop)
+            st.session_state.dataop.update(st.data_editor(st.session_state.dataop.frame()))
             
             def add_dfForm_oop_f():
-                row = pd.DataFrame({'Payment':[st.session_state.input_colAoop],
-                                    'Month':[st.session_state.input_colBoop]})
-                st.session_state.dataop = pd.concat([st.session_state.dataop, row],ignore_index=True)
+                st.session_state.dataop.append(Payment=number(st.session_state.input_colAoop),
+                                               Month=number(st.session_state.input_colBoop))
             
             def delete_last_row_oop_f():
-                if len(st.session_state.dataop) > 0:
-                    st.session_state.dataop = st.session_state.dataop.drop(st.session_state.dataop.tail(1).index)
+                st.session_state.dataop.pop()
             
             dfForm_oop = st.form(key='dfForm_oop')
             with dfForm_oop:
@@ -200,26 +199,21 @@ def main():
         #########################
         ###### MONTHLY OVERPAYMENTS - MOP
         ######################### 
-        mon_over_toggle = st.toggle("Montly overpayments?")
+        mon_over_toggle = st.toggle("Montly overpayments?", key='mon_over_toggle')
 
         if mon_over_toggle:
             st.title('Monthly Overpayments')
-            if 'datamop' not in st.session_state:
-                datamop = pd.DataFrame({'Payment':[],'Start':[],'End':[]})
-                st.session_state.datamop = datamop
             
             st.write("This table describes all the overpayments made over a period of time, from Start Month to End Month.")
-            st.session_state.datamop = st.data_editor(st.session_state.datamop)
+            st.session_state.datamop.update(st.data_editor(st.session_state.datamop.frame()))
             
             def add_dfForm_mon_f():
-                row = pd.DataFrame({'Payment':[st.session_state.input_colAmop],
-                                    'Start':[st.session_state.input_colBmop],
-                                    'End':[st.session_state.input_colCmop]})
-                st.session_state.datamop = pd.concat([st.session_state.datamop, row],ignore_index=True)
+                st.session_state.datamop.append(Payment=number(st.session_state.input_colAmop),
+                                                Start=number(st.session_state.input_colBmop),
+                                                End=number(st.session_state.input_colCmop))
             
             def delete_last_row_mop_f():
-                if len(st.session_state.datamop) > 0:
-                    st.session_state.datamop = st.session_state.datamop.drop(st.session_state.datamop.tail(1).index)
+                st.session_state.datamop.pop()
             
             dfForm_mon = st.form(key='dfForm_mon')
             with dfForm_mon:
@@ -232,6 +226,64 @@ def main():
                     st.text_input('End Month', key='input_colCmop')
                 st.form_submit_button(label="Add monthly payments",on_click=add_dfForm_mon_f)
                 st.form_submit_button(label="Delete last row",on_click=delete_last_row_mop_f)
+            st.divider()
+        
+        
+        #########################
+        ###### BULK IMPORT OF OVERPAYMENTS
+        #########################
+        import_toggle = st.toggle("Import an overpayment plan?")
+        
+        if import_toggle:
+            st.title('Overpayment Plan Import')
+            st.write("A CSV file with the columns Type (One-off or Recurring), Start, End and Payment, like the Overpayment plan sheet of the Excel export. The rows are added to the tables above.")
+            
+            def import_plan_f():
+                source = st.session_state.plan_file or st.session_state.plan_text
+                if not source:
+                    return
+                one_off, recurring, errors = parse_plan(source, st.session_state.dataop, st.session_state.datamop)
+                st.session_state.plan_errors = errors
+                if not errors:
+                    st.session_state.dataop.extend(**one_off)
+                    st.session_state.datamop.extend(**recurring)
+                    st.session_state.over_toggle = st.session_state.over_toggle or len(one_off['Month']) > 0
+                    st.session_state.mon_over_toggle = st.session_state.mon_over_toggle or len(recurring['Start']) > 0
+            
+            st.file_uploader("CSV file", type=['csv'], key='plan_file')
+            st.text_area("Or paste the CSV", key='plan_text')
+            st.button("Import", on_click=import_plan_f)
+            for error in st.session_state.get('plan_errors', []):
+                st.write(error)
+        
+        
+        #########################
+        ###### OVERPAYMENT GOAL SOLVER
+        #########################
+        solver_toggle = st.toggle("Find the overpayment for a goal?")
+        
+        if solver_toggle:
+            st.title('Overpayment Goal')
+            st.write("Finds the smallest overpayment that pays the mortgage off by a given month, or keeps the total interest within a budget.")
+            if frequency != "Monthly":
+                st.write("The months of the goal are counted in instalments.")
+            goal = st.selectbox("Goal", ("Pay off by month", "Total interest at most"))
+            goal_value = st.text_input("Target month" if goal == "Pay off by month" else f"Interest budget ({currency})", "240" if goal == "Pay off by month" else "100000")
+            kind = st.selectbox("Overpayment", (f"{frequency} overpayment", "Lump sum"))
+            goal_month = st.text_input("From month" if kind != "Lump sum" else "Month of the lump sum", "1")
+            
+            if st.button("Solve"):
+                target = {'target_month':int(goal_value)} if goal == "Pay off by month" else {'max_interest':float(goal_value)}
+                solution = solve_overpayment(float(mortgage_amount), float(interest_rate), int(mortgage_period), **target,
+                                             kind='lump_sum' if kind == "Lump sum" else 'monthly', month=int(goal_month),
+                                             convention=payment_convention(FREQUENCIES[frequency], ACCRUALS[accrual]))
+                if solution is None:
+                    cardb("No overpayment of this kind can meet the goal.")
+                else:
+                    card(f"{kind} needed", f"{currency}{clean(solution['overpayment'])}", "#8297ea")
+                    cardb(f"""The mortgage is then paid off in {solution['instalments']} instalments, with a total of {currency}{clean(solution['total_paid'])} paid
+                          and {currency}{clean(solution['total_interest'])} in interests.""")
+            st.divider()
         
         submitted = st.button("Calculate")
             
@@ -253,32 +305,44 @@ def main():
         mortgage_amount = float(mortgage_amount)
         mortgage_period = int(mortgage_period)
         interest_rate   = float(interest_rate)
+        convention = payment_convention(FREQUENCIES[frequency], ACCRUALS[accrual])
         
         
-        total_instalments = mortgage_period*12
-        monthly_payment = payments(mortgage_amount,interest_rate,mortgage_period)
-        total_given = approx(monthly_payment*mortgage_period*12) 
+        with diagnostics.stage('parse') as record:
+            repayments_oop = {}
+            if over_toggle:
+                repayments_oop = one_off_repayments(st.session_state.dataop)
+                
+            repayments_mop = RecurringRepayments()
+            if mon_over_toggle:
+                repayments_mop = recurring_repayments(st.session_state.datamop)
+            record['rows'] = len(repayments_oop) + len(repayments_mop.intervals())
         
-        repayments_oop = {}
-        if over_toggle:
-            repayments_oop = {int(row["Month"]):float(row["Payment"]) for index, row in st.session_state.dataop.iterrows()}
-            
-        repayments_mop = {}
-        if mon_over_toggle:
-            repayments_mop = {month:float(row["Payment"]) for index, row in st.session_state.datamop.iterrows() for month in range(int(row["Start"]),int(row["End"])+1)}
-            
-        table, instalment, payment_to_date = calculate(mortgage_amount, interest_rate, mortgage_period, total_instalments, currency, repayments_oop, repayments_mop)
+        # kept across reruns, so that the table and the export can be built later on request
+        st.session_state.results = (mortgage_amount, interest_rate, mortgage_period, currency, repayments_oop, repayments_mop, convention)
+    
+    if 'results' in st.session_state:
+        mortgage_amount, interest_rate, mortgage_period, currency, repayments_oop, repayments_mop, convention = st.session_state.results
+        total_instalments = convention.instalments(mortgage_period)
+        monthly_payment = convention.payment(mortgage_amount,interest_rate,mortgage_period)
+        total_given = approx(monthly_payment*total_instalments) 
+        
+        # the cards only need the summary, the full table is built lazily below
+        with diagnostics.stage('summarise') as record:
+            instalment, payment_to_date, interest_to_date = summarise(mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, repayments_mop, convention)
+            record['rows'] = instalment
+        warn_increased_payments(monthly_payment, instalment, currency, repayments_mop)
         
         
         #########################
         ###### DISPLAYING
         ######################### 
-        cardb(f"""Total amount borrowed {currency}{clean(mortgage_amount)}, with and interest rate of {clean(denormalise_interest_rate(interest_rate))}, and a repayment over {mortgage_period} years, and {mortgage_period*12} instalments.<br>
+        cardb(f"""Total amount borrowed {currency}{clean(mortgage_amount)}, with and interest rate of {clean(denormalise_interest_rate(interest_rate))}, and a repayment over {mortgage_period} years, and {total_instalments} instalments.<br>
              For each {currency}1 borrowed you are will pay back {currency}{clean(payment_to_date/mortgage_amount)}""")
         
         dfColumns = st.columns(2)
         with dfColumns[0]:
-            card("Montly payments",f"{currency}{clean(monthly_payment)}")
+            card(f"{convention.frequency.capitalize()} payments",f"{currency}{clean(monthly_payment)}")
         with dfColumns[1]:
             card("Total payments",f"{currency}{clean(payment_to_date)}")
         
@@ -286,10 +350,20 @@ def main():
         # with dfColumns[0]:
         #     card(f"Total amount borrowed {currency}{clean(mortgage_amount)}, with and interest rate of {clean(denormalise_interest_rate(interest_rate))}, and a repayment over {mortgage_period} ({mortgage_period*12} instalments)")
         if len(repayments_oop) > 0 or len(repayments_mop) > 0:
-            card(f"Early repayments reduced your mortgage to {instalment} instalments.",f"{(total_instalments-instalment)/12:.0f} year(s) and {(total_instalments-instalment)% 12} months earlier!","#8297ea")
+            card(f"Early repayments reduced your mortgage to {instalment} instalments.",f"{time_saved(total_instalments-instalment, convention)} earlier!","#8297ea")
         
-        st.write("### Monthly instalments")
-        st.dataframe(table)
+        st.write(f"### {convention.frequency.capitalize()} instalments")
+        if st.toggle("Show all the instalments"):
+            # long schedules (weekly, daily) are shown by year by default, and a page at a time
+            yearly = st.toggle("Yearly totals", value=instalment > PAGE_SIZE)
+            with diagnostics.stage('calculate', rows=instalment):
+                table, _, _ = schedule_table(mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, repayments_mop, convention, yearly)
+            if len(table) > PAGE_SIZE:
+                pages = -(-len(table)//PAGE_SIZE)
+                page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1)
+                table = table.iloc[(page-1)*PAGE_SIZE:page*PAGE_SIZE]
+            with diagnostics.stage('render', rows=len(table)):
+                st.dataframe(style_table(table, currency))
         
         
         st.html("""
@@ -314,14 +388,14 @@ def main():
             
             repayments_text = ""
             if len(repayments_oop): repayments_text+=f"Then you performed {len(repayments_oop)} one-off lump sum repayments, of a total of {currency}{clean(sum([rep for _,rep in repayments_oop.items()]))}. "
-            if len(repayments_mop): repayments_text+=f"Then you performed {len(repayments_mop)} monthly repayments, of a total of {currency}{clean(sum([rep for _,rep in repayments_mop.items()]))}. "  
+            if len(repayments_mop): repayments_text+=f"Then you performed {len(repayments_mop)} monthly repayments, of a total of {currency}{clean(repayments_mop.total())}. "  
             st.html(f"""
                     <div class="card">
                       <h5 class="card-header">Report on changes</h5>
                       <div class="card-body">
-                        <p class="card-text">Total amount borrowed {currency}{clean(mortgage_amount)}, with an initial interest rate of {clean(denormalise_interest_rate(interest_rate))}. Repayments were set over {mortgage_period} years, and {mortgage_period*12} instalments.</p>
-                        <p class="card-text">Thanks to early repayments you shortened your mortgage to {instalment} instalments, meaning {(total_instalments-instalment)/12:.0f} year(s) and {(total_instalments-instalment)% 12} months earlier than planned.</p>
-                        <p class="card-text">Montly payments was initially set to {currency}{clean(monthly_payment)}</p>
+                        <p class="card-text">Total amount borrowed {currency}{clean(mortgage_amount)}, with an initial interest rate of {clean(denormalise_interest_rate(interest_rate))}. Repayments were set over {mortgage_period} years, and {total_instalments} instalments.</p>
+                        <p class="card-text">Thanks to early repayments you shortened your mortgage to {instalment} instalments, meaning {time_saved(total_instalments-instalment, convention)} earlier than planned.</p>
+                        <p class="card-text">{convention.frequency.capitalize()} payments were initially set to {currency}{clean(monthly_payment)}</p>
                         <p class="card-text">{repayments_text}</p>
                         <p class="card-text">Your total repayment is {currency}{clean(payment_to_date)} (instead of the original {currency}{clean(total_given)}), saving a total of {currency}{clean(total_given-payment_to_date)} in interests!</p>
                         <p class="card-text">For each £1 borrowed you are will pay back {currency}{clean(payment_to_date/mortgage_amount)}, instead of {currency}{clean(total_given/mortgage_amount)}</p>
@@ -332,23 +406,39 @@ def main():
 
                  
         
-        # buffer to use for excel writer
-        buffer = BytesIO()
-        
-        export_file = st.text_input(f"Filename (exluding xlsx)", "My_Mortgage_Analysis")
+        export_file = st.text_input(f"Filename (excluding extension)", "My_Mortgage_Analysis")
+        export_format = st.selectbox("Export format", tuple(EXPORTS))
 
-        
-        # download button to download dataframe as xlsx
-        with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-            # Write each dataframe to a different worksheet.
-            table.to_excel(writer, sheet_name='Sheet1', index=True)
-            writer._save()
-            download2 = st.download_button(
-                label="Download data as Excel",
-                data=buffer,
-                file_name=f"{export_file}.xlsx",
-                mime='application/vnd.ms-excel'
-            )
+        if st.toggle("Prepare the export"):
+            schedule, _, _ = schedule_cache.amortize(mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, repayments_mop, convention)
+            columns = schedule_columns(repayments_oop, repayments_mop)
+            extension, mime = EXPORTS[export_format]
+            
+            # the rows are streamed to a temporary file rather than kept in a buffer
+            with tempfile.TemporaryDirectory() as folder, diagnostics.stage('export', rows=instalment, format=extension):
+                export_path = os.path.join(folder, f"export.{extension}")
+                if export_format == "Excel":
+                    _, _, original_interest = summarise(mortgage_amount, interest_rate, mortgage_period, total_instalments, convention=convention)
+                    summary = {"Amount borrowed":mortgage_amount, "Interest rate (%)":denormalise_interest_rate(interest_rate), "Mortgage period (years)":mortgage_period,
+                               "Payment frequency":convention.frequency, "Interest accrual":convention.accrual,
+                               f"{convention.frequency.capitalize()} payment":monthly_payment, "Instalments":instalment, "Total paid":payment_to_date, "Total interest":interest_to_date}
+                    scenarios = [{"Scenario":"Original plan", "Instalments":total_instalments, "Total paid":total_given, "Total interest":original_interest},
+                                 {"Scenario":"With overpayments", "Instalments":instalment, "Total paid":payment_to_date, "Total interest":interest_to_date}]
+                    write_workbook(export_path, schedule, instalment, columns, summary, repayments_oop, repayments_mop, scenarios)
+                else:
+                    with open(export_path, 'wb') as export:
+                        WRITERS[extension](export, schedule_blocks(schedule, instalment, columns))
+                
+                with open(export_path, 'rb') as export:
+                    download2 = st.download_button(
+                        label=f"Download data as {export_format}",
+                        data=export,
+                        file_name=f"{export_file}.{extension}",
+                        mime=mime
+                    )
+    
+    if diagnostics.enabled:
+        diagnostics_panel(diagnostics)
     
     
     
@@ -0,0 +1,120 @@
+## This file contains the command line entry point to amortize files of loans without the web app
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from export import batch_blocks, WRITERS
+from schedules import RecurringRepayments
+
+
+def parse_one_off(value)->dict:
+    """Reads one-off payments given as "month:amount;month:amount", as a JSON object or as a list of pairs"""
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return {int(month):float(amount) for month, amount in value.items()}
+    if isinstance(value, list):
+        return {int(month):float(amount) for month, amount in value}
+    return {int(month):float(amount) for month, amount in (item.split(':') for item in value.split(';') if item.strip())}
+
+
+def parse_recurring(value)->RecurringRepayments:
+    """Reads recurring payments given as "start-end:amount;start-end:amount" or as a list of periods like check_recurring_repayments"""
+    if not value:
+        return None
+    if isinstance(value, list):
+        return RecurringRepayments.from_periods(value)
+    periods = [item.split(':') for item in value.split(';') if item.strip()]
+    months = [period.split('-') for period, _ in periods]
+    return RecurringRepayments.from_arrays([int(start) for start, _ in months], [int(end) for _, end in months], [float(amount) for _, amount in periods])
+
+
+def read_loans(path:str):
+    """Iterates over the loans of a CSV or JSONL file, one record at a time"""
+    with open(path, newline='') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def amortize_chunk(records:list, full_schedules:bool, first:int=0)->list:
+    """Worker: parses a chunk of loan records and amortizes them together (loans without an id are numbered from first)"""
+    loan_ids = [record.get('id', first + position) for position, record in enumerate(records)]
+    blocks = batch_blocks([float(record['mortgage_amount']) for record in records],
+                          [float(record['interest_rate']) for record in records],
+                          [int(record['mortgage_period']) for record in records],
+                          [parse_one_off(record.get('one_off')) for record in records],
+                          [parse_recurring(record.get('recurring')) for record in records],
+                          full_schedules, chunk_size=len(records), loan_ids=loan_ids)
+    return list(blocks)
+
+
+def run(input_path:str, output_path:str, full_schedules:bool=False, workers:int=None, chunk_size:int=1000)->dict:
+    """
+    Amortizes all the loans of a file over a pool of processes and streams the
+    results to the output file, keeping at most two chunks per worker in flight.
+
+    Returns
+    -------
+    dict
+        Number of loans and rows written, and elapsed seconds.
+
+    """
+    extension = os.path.splitext(output_path)[1].lstrip('.')
+    if extension not in WRITERS:
+        raise ValueError(f"Unsupported output format '{extension}', use one of {', '.join(WRITERS)}")
+    workers = workers or os.cpu_count()
+    stats = {'loans':0, 'rows':0}
+    start = time.perf_counter()
+
+    def results(executor):
+        loans = read_loans(input_path)
+        pending = deque()
+        while True:
+            while len(pending) < 2*workers:
+                records = list(islice(loans, chunk_size))
+                if not records:
+                    break
+                pending.append(executor.submit(amortize_chunk, records, full_schedules, stats['loans']))
+                stats['loans'] += len(records)
+            if not pending:
+                return
+            for block in pending.popleft().result():
+                stats['rows'] += len(block['Loan'])
+                yield block
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, open(output_path, 'wb') as output:
+        WRITERS[extension](output, results(executor))
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+def main(argv:list=None):
+    parser = argparse.ArgumentParser(description="Amortizes a CSV or JSONL file of loans (columns id, mortgage_amount, interest_rate, mortgage_period, one_off, recurring)")
+    parser.add_argument('input', help="CSV or JSONL file of loans")
+    parser.add_argument('output', help="output file, .csv, .jsonl or .parquet")
+    parser.add_argument('--schedules', action='store_true', help="write the full schedules instead of one summary per loan")
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="loans amortized together by a worker")
+    args = parser.parse_args(argv)
+    extension = os.path.splitext(args.output)[1].lstrip('.')
+    if extension not in WRITERS:
+        parser.error(f"unsupported output format '{extension}', use one of {', '.join(WRITERS)}")
+
+    stats = run(args.input, args.output, args.schedules, args.workers, args.chunk_size)
+    print(f"{stats['loans']} loans, {stats['rows']} rows in {stats['seconds']:.2f}s "
+          f"({stats['loans']/max(stats['seconds'], 1e-9):,.0f} loans/s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
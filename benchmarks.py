@@ -0,0 +1,211 @@
+## This file contains the benchmark suite of the amortization and export hot paths, with JSON baselines and a regression check
+
+import argparse
+import io
+import json
+import platform
+import re
+import statistics
+import sys
+import time
+import timeit
+from functools import partial
+
+import numpy as np
+
+from conventions import payment_convention
+from engine import amortize, summarise, calculate_batch, schedule_columns
+from export import schedule_blocks, batch_blocks, write_csv, write_workbook
+from miscellaneous import payments, convert_recurring_repayments
+from schedules import RecurringRepayments
+
+TERMS = (5, 15, 30, 50)
+BATCH_SIZES = (1000, 10000, 100000)
+THRESHOLD = 0.25
+
+
+def overpayment_plans(mortgage_period:int, kind:str)->tuple:
+    """The (repayments_oop, repayments_mop) of a workload: none, a one-off payment every quarter, or a new monthly amount every year"""
+    total_instalments = mortgage_period*12
+    if kind == 'one_off':
+        return {month:500.0 for month in range(3, total_instalments + 1, 3)}, RecurringRepayments()
+    if kind == 'monthly':
+        monthly_payment = payments(250000, 3.4, mortgage_period)
+        starts = np.arange(1, total_instalments + 1, 12)
+        return {}, RecurringRepayments(starts, starts + 11, monthly_payment + 10*np.arange(len(starts)))
+    return {}, RecurringRepayments()
+
+
+def random_book(loans:int, seed:int=0)->tuple:
+    """A book of loans with terms from 5 to 50 years, a third of them with a monthly overpayment"""
+    rng = np.random.default_rng(seed)
+    amounts = rng.uniform(50000, 1000000, loans).round(-3)
+    rates = rng.uniform(1, 8, loans).round(2)
+    periods = rng.integers(5, 51, loans)
+    repayments_mop = [RecurringRepayments([1], [period*12], [payments(amount, rate, period) + 100]) if loan % 3 == 0 else None
+                      for loan, (amount, rate, period) in enumerate(zip(amounts.tolist(), rates.tolist(), periods.tolist()))]
+    return amounts, rates, periods, repayments_mop
+
+
+def _amortize(mortgage_period:int, kind:str):
+    arguments = (250000, 3.4, mortgage_period, mortgage_period*12, *overpayment_plans(mortgage_period, kind))
+    return lambda: amortize(*arguments)
+
+
+def _summarise(mortgage_period:int, kind:str):
+    arguments = (250000, 3.4, mortgage_period, mortgage_period*12, *overpayment_plans(mortgage_period, kind))
+    return lambda: summarise(*arguments)
+
+
+def _amortize_daily(frequency:str):
+    convention = payment_convention(frequency, 'daily')
+    arguments = (250000, 3.4, 50, convention.instalments(50), {month:500.0 for month in range(26, convention.instalments(50), 26)})
+    return lambda: amortize(*arguments, convention=convention)
+
+
+def _convert(count:int):
+    periods = [{"start":start, "end":start + 9, "amount_paid":1200.0 + start} for start in range(1, 10*count, 10)]
+    return lambda: convert_recurring_repayments(periods)
+
+
+def _batch(loans:int):
+    book = random_book(loans)
+    return lambda: calculate_batch(*book[:3], repayments_mop=book[3])
+
+
+def _export(mortgage_period:int, writer:str):
+    repayments_oop, repayments_mop = overpayment_plans(mortgage_period, 'one_off')
+    schedule, instalment, payment_to_date = amortize(250000, 3.4, mortgage_period, mortgage_period*12, repayments_oop, repayments_mop)
+    columns = schedule_columns(repayments_oop, repayments_mop)
+    if writer == 'csv':
+        return lambda: write_csv(io.BytesIO(), schedule_blocks(schedule, instalment, columns))
+    summary = {'Instalments':instalment, 'Total paid':payment_to_date}
+    return lambda: write_workbook(io.BytesIO(), schedule, instalment, columns, summary, repayments_oop, repayments_mop)
+
+
+def _export_batch(loans:int):
+    book = random_book(loans)
+    return lambda: write_csv(io.BytesIO(), batch_blocks(*book[:3], repayments_mop=book[3]))
+
+
+def workloads(quick:bool=False)->dict:
+    """
+    The benchmarks, name -> factory. A factory builds the inputs of its
+    benchmark and returns the callable without arguments to time, so that
+    only the hot path is timed and only the selected benchmarks build theirs.
+    """
+    factories = {}
+    for mortgage_period in TERMS:
+        factories[f'payments/{mortgage_period}y'] = lambda mortgage_period=mortgage_period: lambda: payments(250000, 3.4, mortgage_period)
+        for kind in ('none', 'one_off', 'monthly'):
+            factories[f'amortize/{mortgage_period}y/{kind}'] = partial(_amortize, mortgage_period, kind)
+            factories[f'summarise/{mortgage_period}y/{kind}'] = partial(_summarise, mortgage_period, kind)
+    for frequency in ('weekly', 'daily'):
+        factories[f'amortize/50y/{frequency}'] = partial(_amortize_daily, frequency)
+    for count in (12, 120):
+        factories[f'convert_recurring_repayments/{count}'] = partial(_convert, count)
+    for loans in BATCH_SIZES[:2] if quick else BATCH_SIZES:
+        factories[f'batch/{loans}'] = partial(_batch, loans)
+    for mortgage_period in (30, 50):
+        for writer in ('csv', 'xlsx'):
+            factories[f'export/{writer}/{mortgage_period}y'] = partial(_export, mortgage_period, writer)
+    factories[f'export/batch_csv/{BATCH_SIZES[1]}'] = partial(_export_batch, BATCH_SIZES[1])
+    return factories
+
+
+def measure(function, repeat:int=5)->dict:
+    """Times a callable: the number of calls per run is picked so that a run lasts at least 0.2s, and the best run is kept as the reference"""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    runs = [seconds/number for seconds in timer.repeat(repeat=repeat, number=number)]
+    return {'min':min(runs), 'median':statistics.median(runs), 'number':number, 'repeat':repeat}
+
+
+def run(pattern:str=None, quick:bool=False, repeat:int=5, verbose:bool=True)->dict:
+    """Runs the benchmarks whose name matches the regular expression pattern and returns the results with the environment they ran in"""
+    results = {}
+    for name, factory in workloads(quick).items():
+        if pattern and not re.search(pattern, name):
+            continue
+        results[name] = measure(factory(), repeat)
+        if verbose:
+            print(f"{name:<40} {results[name]['min']*1e3:>12.4f} ms", file=sys.stderr)
+    return {'created':time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python':platform.python_version(),
+            'numpy':np.__version__,
+            'machine':platform.platform(),
+            'results':results,
+            }
+
+
+def compare(baseline:dict, current:dict, threshold:float=THRESHOLD)->list:
+    """
+    Compares two sets of results on their best times.
+
+    Returns
+    -------
+    list
+        (name, baseline seconds, current seconds, ratio, status) for every
+        benchmark, status being 'regression' when the current time exceeds the
+        baseline by more than threshold (a fraction), 'faster' when it is below
+        by more than threshold, 'ok' otherwise, and 'new' or 'missing' when the
+        benchmark only exists on one side.
+
+    """
+    rows = []
+    for name in list(baseline['results']) + [name for name in current['results'] if name not in baseline['results']]:
+        before, after = baseline['results'].get(name), current['results'].get(name)
+        if before is None or after is None:
+            rows.append((name, before and before['min'], after and after['min'], None, 'new' if before is None else 'missing'))
+            continue
+        ratio = after['min']/before['min']
+        status = 'regression' if ratio > 1 + threshold else 'faster' if ratio < 1 - threshold else 'ok'
+        rows.append((name, before['min'], after['min'], ratio, status))
+    return rows
+
+
+def main(argv:list=None)->int:
+    parser = argparse.ArgumentParser(description="Benchmarks the amortization and export hot paths")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help="run the benchmarks and save the results as a JSON baseline")
+    run_parser.add_argument('--output', '-o', default='benchmarks.json', help="JSON file of the results")
+    compare_parser = commands.add_parser('compare', help="compare results to a baseline, failing on regressions")
+    compare_parser.add_argument('baseline', help="JSON file of the baseline")
+    compare_parser.add_argument('current', nargs='?', help="JSON file of the results to check (default: run the benchmarks now)")
+    compare_parser.add_argument('--threshold', type=float, default=THRESHOLD, help="slowdown allowed, as a fraction of the baseline time")
+    for subparser in (run_parser, compare_parser):
+        subparser.add_argument('--filter', '-k', default=None, help="only the benchmarks whose name matches this regular expression")
+        subparser.add_argument('--quick', action='store_true', help="skip the largest batch")
+        subparser.add_argument('--repeat', type=int, default=5, help="timed runs per benchmark")
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = run(args.filter, args.quick, args.repeat)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        current = run(args.filter, args.quick, args.repeat, verbose=False)
+    if args.filter:
+        baseline['results'] = {name:result for name, result in baseline['results'].items() if re.search(args.filter, name)}
+        current['results'] = {name:result for name, result in current['results'].items() if re.search(args.filter, name)}
+
+    rows = compare(baseline, current, args.threshold)
+    for name, before, after, ratio, status in rows:
+        times = f"{before*1e3:>12.4f} {after*1e3:>12.4f} {ratio:>7.2f}x" if ratio is not None else f"{'':>34}"
+        print(f"{name:<40} {times}  {status}")
+    regressions = [row[0] for row in rows if row[4] == 'regression']
+    if regressions:
+        print(f"{len(regressions)} regression(s) past {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
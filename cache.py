@@ -0,0 +1,117 @@
+## This file contains the result cache shared by all the sessions of the calculator
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from engine import amortize, COLUMNS
+from schedules import RecurringRepayments, as_recurring
+from conventions import PaymentConvention, MONTHLY
+
+
+def normalise_schedule(repayments_oop:dict={}, repayments_mop:dict={})->tuple:
+    """Turns the overpayments into a hashable form that does not depend on the order they were entered"""
+    return tuple(sorted(repayments_oop.items())), as_recurring(repayments_mop).intervals()
+
+
+def first_change(schedule:tuple, other:tuple)->int:
+    """First month in which two normalised overpayment schedules differ (None if they are the same)"""
+    months = [month for month, _ in set(schedule[0]).symmetric_difference(other[0])]
+    recurring = RecurringRepayments.from_intervals(schedule[1]).first_difference(RecurringRepayments.from_intervals(other[1]))
+    if recurring is not None:
+        months.append(recurring)
+    return min(months) if months else None
+
+
+class ScheduleCache:
+    """
+    LRU cache of amortization schedules, bounded by the bytes of their arrays
+    (a daily schedule over 50 years alone takes about 1.2 MB). A schedule
+    larger than max_bytes is returned but not kept.
+
+    Entries are keyed on (amount, rate, period, instalments, convention,
+    normalised overpayments). On a miss, the cached schedule of the same loan whose
+    overpayments diverge the latest is reused up to the last checkpoint
+    (every `checkpoint_every` months) preceding the first changed month, and
+    only the remaining months are recomputed.
+    """
+
+    def __init__(self, max_bytes:int=64*1024*1024, checkpoint_every:int=12):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.checkpoint_every = checkpoint_every
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def stats(self)->dict:
+        """Counters used to size the cache"""
+        with self._lock:
+            return {'hits':self.hits, 'partial_hits':self.partial_hits, 'misses':self.misses,
+                    'size':len(self._entries), 'bytes':self.bytes, 'max_bytes':self.max_bytes}
+
+    def clear(self):
+        """Empties the cache and resets the counters"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.bytes = 0
+            self.hits = self.partial_hits = self.misses = 0
+
+    def _checkpoint(self, key:tuple)->tuple:
+        """Finds the cached schedule and the checkpoint month to resume from, for the loan in key"""
+        loan, plan = key[:5], key[5]
+        best, best_month = None, 0
+        for other, entry in self._entries.items():
+            if other[:5] != loan:
+                continue
+            changed = first_change(plan, other[5])
+            if changed is None:
+                changed = entry[1]
+            # a plan changing in month 0 (or before the first instalment) cannot reuse anything
+            month = max(min(changed - 1, entry[1] - 1), 0)
+            month -= month % self.checkpoint_every
+            if month > best_month:
+                best, best_month = entry, month
+        return best, best_month
+
+    def amortize(self, mortgage_amount:int, interest_rate:float, mortgage_period:int, total_instalments:int, repayments_oop:dict={}, repayments_mop:dict={}, convention:PaymentConvention=MONTHLY):
+        """Same as engine.amortize(), served from the cache when possible. The returned arrays are shared and must not be modified."""
+        key = (mortgage_amount, interest_rate, mortgage_period, total_instalments, convention, normalise_schedule(repayments_oop, repayments_mop))
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            prefix, month = self._checkpoint(key)
+            if prefix is None:
+                self.misses += 1
+            else:
+                self.partial_hits += 1
+
+        if prefix is None:
+            result = amortize(mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, repayments_mop, convention=convention)
+        else:
+            schedule = prefix[0]
+            checkpoint = (month, schedule[COLUMNS[0]][month], schedule[COLUMNS[2]][month-1], schedule[COLUMNS[4]][month-1], schedule[COLUMNS[6]][month-1])
+            rest, instalment, payment_to_date = amortize(mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, repayments_mop, checkpoint, convention)
+            result = {column:np.concatenate((schedule[column][:month], rest[column])) for column in COLUMNS}, instalment, payment_to_date
+
+        size = sum(values.nbytes for values in result[0].values())
+        with self._lock:
+            if size > self.max_bytes or key in self._entries:
+                return result
+            self._entries[key] = result
+            self._sizes[key] = size
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                oldest, _ = self._entries.popitem(last=False)
+                self.bytes -= self._sizes.pop(oldest)
+        return result
+
+
+schedule_cache = ScheduleCache()
@@ -0,0 +1,71 @@
+## This file contains the payment frequencies and the interest accrual conventions
+
+from typing import NamedTuple
+
+from miscellaneous import approx, normalise_interest_rate
+
+FREQUENCIES = {'monthly':12, 'fortnightly':26, 'weekly':52, 'daily':365}
+DAYS = {'monthly':365/12, 'fortnightly':14, 'weekly':7, 'daily':1}
+ACCRUALS = ('periodic', 'daily', 'daily_compound')
+
+
+class PaymentConvention(NamedTuple):
+    """
+    How often the mortgage is repaid and how the interest accrues between two
+    instalments.
+
+    With the 'periodic' accrual the annual rate is split evenly between the
+    instalments of a year (the monthly convention of payments() and
+    current_interest_paid()). With 'daily' the interest accrues every day at
+    rate/365, without compounding within the period, and with
+    'daily_compound' the daily interest is capitalised every day. A month
+    counts as 365/12 days.
+    """
+    frequency: str = 'monthly'
+    accrual: str = 'periodic'
+
+    @property
+    def periods_per_year(self)->int:
+        return FREQUENCIES[self.frequency]
+
+    def instalments(self, mortgage_period:int)->int:
+        """Number of instalments over the term"""
+        return mortgage_period*self.periods_per_year
+
+    def rate(self, interest_rate:float)->float:
+        """Interest rate of one instalment period, as a decimal"""
+        interest_rate = normalise_interest_rate(interest_rate)
+        if self.accrual == 'periodic':
+            return interest_rate/self.periods_per_year
+        if self.accrual == 'daily':
+            return interest_rate*DAYS[self.frequency]/365
+        return pow(1 + interest_rate/365, DAYS[self.frequency]) - 1
+
+    def interest(self, principal, interest_rate:float):
+        """Interest charged over one instalment period on the principal (a float or an array)"""
+        if self.accrual == 'periodic':
+            return principal*normalise_interest_rate(interest_rate)/self.periods_per_year
+        return principal*self.rate(interest_rate)
+
+    def payment(self, mortgage_amount:float, interest_rate:float, mortgage_period:int)->float:
+        """Instalment that repays the mortgage over the term, as payments() does for monthly instalments"""
+        rate = self.rate(interest_rate)
+        instalments = self.instalments(mortgage_period)
+        if rate == 0:
+            return approx(mortgage_amount/instalments)
+        temp = pow(1 + rate, instalments)
+        if self.accrual == 'periodic':
+            return approx(mortgage_amount*(normalise_interest_rate(interest_rate)*temp/self.periods_per_year)/(temp-1))
+        return approx(mortgage_amount*rate*temp/(temp-1))
+
+
+MONTHLY = PaymentConvention()
+
+
+def payment_convention(frequency:str='monthly', accrual:str='periodic')->PaymentConvention:
+    """Builds a convention, checking the names of the frequency and of the accrual"""
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unknown payment frequency '{frequency}', use one of {', '.join(FREQUENCIES)}")
+    if accrual not in ACCRUALS:
+        raise ValueError(f"Unknown interest accrual '{accrual}', use one of {', '.join(ACCRUALS)}")
+    return PaymentConvention(frequency, accrual)
@@ -0,0 +1,117 @@
+## This file contains the lightweight timing and memory instrumentation of the hot paths
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+ENVIRONMENT_VARIABLE = 'MORTGAGE_DIAGNOSTICS'
+QUERY_PARAMETER = 'diagnostics'
+SWITCHED_ON = ('1', 'true', 'yes', 'on')
+
+logger = logging.getLogger('mortgage.diagnostics')
+# tracemalloc is global to the process: only one run at a time traces the memory
+_memory_lock = threading.Lock()
+
+
+def diagnostics_enabled(environ:dict=os.environ, query_params:dict={})->bool:
+    """Whether the diagnostics are switched on, by the environment variable or by the query parameter (1, true, yes or on)"""
+    return any(str(source.get(key, '')).strip().lower() in SWITCHED_ON for source, key in ((environ, ENVIRONMENT_VARIABLE), (query_params, QUERY_PARAMETER)))
+
+
+def memory_tracing_enabled(environ:dict=os.environ)->bool:
+    """Whether the memory is traced too, which only the environment variable can switch on (the query parameter only gives the timings)"""
+    return str(environ.get(ENVIRONMENT_VARIABLE, '')).strip().lower() in SWITCHED_ON
+
+
+def configure_logging(stream=sys.stderr):
+    """Sends the diagnostics, one JSON object per line, to stream unless a handler has already been set up"""
+    if not logger.handlers:
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+class Diagnostics:
+    """
+    Collects the wall time, row count and peak memory of the stages of a run,
+    and logs each stage as a structured JSON line.
+
+    When disabled every stage is a no-op, so the instrumentation can stay in
+    the hot paths. With memory, tracemalloc is started for the run and stopped
+    by close(), which slows the allocations down: the timings are then meant
+    to compare the stages with each other, not as absolute figures. As the
+    tracing is global to the process, a run only traces the memory when no
+    other run does, and otherwise reports timings only (peak_bytes None).
+    Stages can be nested, the peak of an inner stage counting in the outer one.
+    """
+
+    def __init__(self, enabled:bool=False, memory:bool=False, **context):
+        self.enabled = enabled
+        self.context = context
+        self.run = uuid.uuid4().hex[:12]
+        self.stages = []
+        self._open = []
+        self.memory = False
+        self._started = False
+        if enabled:
+            configure_logging()
+            if memory and _memory_lock.acquire(blocking=False):
+                self.memory = True
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._started = True
+
+    def close(self):
+        """Stops the memory tracing if this run started it and lets another run trace"""
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        if self.memory:
+            self.memory = False
+            _memory_lock.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextmanager
+    def stage(self, name:str, rows:int=None, **details):
+        """Measures the block of code as the stage name; the record yielded can be updated, e.g. with the rows once they are known"""
+        record = {'stage':name, 'depth':len(self._open), 'rows':rows, **details}
+        if not self.enabled:
+            yield record
+            return
+        if self.memory:
+            if self._open:
+                parent = self._open[-1]
+                parent['_peak'] = max(parent['_peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            record['_start'], record['_peak'] = tracemalloc.get_traced_memory()
+        self._open.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            record['peak_bytes'] = None
+            self._open.pop()
+            if self.memory:
+                peak = max(record.pop('_peak'), tracemalloc.get_traced_memory()[1])
+                record['peak_bytes'] = max(peak - record.pop('_start'), 0)
+                if self._open:
+                    self._open[-1]['_peak'] = max(self._open[-1]['_peak'], peak)
+            self.stages.append(record)
+            logger.info(json.dumps({'event':'stage', 'run':self.run, **self.context, **record}, default=str))
+
+    def total(self)->float:
+        """Wall time of the outermost stages"""
+        return sum(record['seconds'] for record in self.stages if record['depth'] == 0)
@@ -0,0 +1,372 @@
+## This file contains the vectorised amortization engine used by the calculator
+
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+from miscellaneous import approx, clean
+from schedules import as_recurring
+from conventions import PaymentConvention, MONTHLY
+
+COLUMNS = ['Principal to date','Payment','Paid to date','Interest charged', 'Interest charged to date', 'Principal repaid', 'Principal repaid to date', 'Remaining principal','One-off','Increased']
+
+
+class PaymentWarning(NamedTuple):
+    """An increased payment set lower than the original monthly payment"""
+    month: int
+    payment: float
+    monthly_payment: float
+
+    def describe(self, currency:str="")->str:
+        return f"For month {self.month} your repayment is set to {currency}{clean(self.payment)} instead of the original {currency}{clean(self.monthly_payment)}"
+
+
+def increased_payment_warnings(monthly_payment:float, instalment:int, repayments_mop:dict={})->list:
+    """Finds the increased payments, up to the last instalment, that are lower than the original payment"""
+    return [PaymentWarning(month, amount, monthly_payment)
+            for start, end, amount in as_recurring(repayments_mop).intervals() if amount < monthly_payment
+            for month in range(max(start, 1), min(end, instalment)+1)]
+
+
+def schedule_columns(repayments_oop:dict={}, repayments_mop:dict={})->list:
+    """Columns shown for a schedule: One-off and Increased only when there are such payments"""
+    columns = COLUMNS[:8]
+    if len(repayments_oop) > 0:
+        columns = columns + ['One-off']
+    if len(repayments_mop) > 0:
+        columns = columns + ['Increased']
+    return columns
+
+
+def schedule_frame(schedule:dict, instalment:int, columns:list=COLUMNS):
+    """Builds the DataFrame of a schedule, indexed by instalment (pandas is only imported here)"""
+    import pandas as pd
+
+    return pd.DataFrame({column:schedule[column] for column in columns}, index=pd.RangeIndex(1, instalment+1))
+
+
+def yearly_frame(schedule:dict, instalment:int, columns:list=COLUMNS, periods_per_year:int=12):
+    """Aggregates a schedule by year: the payments, interest and principal repaid are added up, the amounts to date are taken at the end of the year"""
+    import pandas as pd
+
+    starts = np.arange(0, instalment, periods_per_year)
+    ends = np.minimum(starts + periods_per_year, instalment) - 1
+    aggregate = {COLUMNS[0]:lambda values: values[starts],
+                 COLUMNS[1]:lambda values: np.add.reduceat(values, starts),
+                 COLUMNS[3]:lambda values: np.add.reduceat(values, starts),
+                 COLUMNS[5]:lambda values: np.add.reduceat(values, starts),
+                 COLUMNS[8]:lambda values: np.logical_or.reduceat(values, starts),
+                 COLUMNS[9]:lambda values: np.logical_or.reduceat(values, starts)}
+    return pd.DataFrame({column:aggregate.get(column, lambda values: values[ends])(schedule[column][:instalment]) for column in columns},
+                        index=pd.RangeIndex(1, len(starts)+1, name='Year'))
+
+
+def segment_balances(principal:float, payment:float, interest_rate:float, months:int, convention:PaymentConvention=MONTHLY)->np.ndarray:
+    """Closed-form balances at the start of each month (instalment period) of a constant-payment segment (the first one is the principal itself)"""
+    rate = convention.rate(interest_rate)
+    steps = np.arange(months + 1, dtype=np.float64)
+    if rate == 0:
+        return principal - payment*steps
+    growth = np.power(1 + rate, steps)
+    return principal*growth - payment*(growth - 1)/rate
+
+
+def planned_payments(monthly_payment:float, total_instalments:int, repayments_oop:dict={}, repayments_mop:dict={}):
+    """Expands the overpayments into the payment due each month, together with the One-off and Increased flags"""
+    payment = np.full(total_instalments, monthly_payment, dtype=np.float64)
+    one_off = np.zeros(total_instalments, dtype=bool)
+    increased = np.zeros(total_instalments, dtype=bool)
+    for start, end, amount in as_recurring(repayments_mop).intervals():
+        start, end = max(start, 1), min(end, total_instalments)
+        if start <= end:
+            payment[start-1:end] = amount
+            increased[start-1:end] = True
+    for month, amount in repayments_oop.items():
+        if 1 <= month <= total_instalments:
+            payment[month-1] += amount
+            one_off[month-1] = True
+    return payment, one_off, increased
+
+
+def balance_after(principal:float, payment:float, interest_rate:float, months:int, convention:PaymentConvention=MONTHLY)->float:
+    """Closed-form balance left after paying a constant payment for the given number of months (instalment periods)"""
+    rate = convention.rate(interest_rate)
+    if rate == 0:
+        return principal - payment*months
+    growth = pow(1 + rate, months)
+    return principal*growth - payment*(growth - 1)/rate
+
+
+def segment_starts(payment:np.ndarray)->np.ndarray:
+    """Boundaries of the segments of constant payment: month 0, every month where the payment changes, and the end of the term"""
+    return np.concatenate(([0], np.flatnonzero(np.diff(payment) != 0) + 1, [len(payment)]))
+
+
+def payment_segments(monthly_payment:float, total_instalments:int, repayments_oop:dict={}, repayments_mop:dict={})->list:
+    """Same payments as planned_payments(), as a list of (start, end, payment) segments whose boundaries are the overpayment intervals"""
+    repayments_mop = as_recurring(repayments_mop)
+    boundaries = {0, total_instalments}
+    for start, end, _ in repayments_mop.intervals():
+        boundaries.update((start - 1, end))
+    for month in repayments_oop:
+        boundaries.update((month - 1, month))
+    boundaries = sorted(boundary for boundary in boundaries if 0 <= boundary <= total_instalments)
+    segments = []
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        payment = repayments_mop.get(start + 1, monthly_payment)
+        if end == start + 1 and end in repayments_oop:
+            payment += repayments_oop[end]
+        if segments and segments[-1][2] == payment:
+            segments[-1] = (segments[-1][0], end, payment)
+        else:
+            segments.append((start, end, payment))
+    return segments
+
+
+def payoff_month(principal:float, payment:float, interest_rate:float, months:int, convention:PaymentConvention=MONTHLY)->int:
+    """Finds, in closed form, the first month of a constant-payment segment that starts with principal <= payment (months if none does)"""
+    if principal <= payment:
+        return 0
+    rate = convention.rate(interest_rate)
+    if rate == 0:
+        month = math.ceil((principal - payment)/payment) if payment > 0 else months
+    elif payment <= principal*rate:
+        return months # the payment does not even cover the interest
+    else:
+        month = math.ceil(math.log(payment*(1 - rate)/(payment - principal*rate))/math.log(1 + rate))
+    # the logarithm can be off by one month on the boundary
+    month = max(1, min(month, months))
+    if balance_after(principal, payment, interest_rate, month - 1, convention) <= payment:
+        month -= 1
+    elif month < months and balance_after(principal, payment, interest_rate, month, convention) > payment:
+        month += 1
+    return min(month, months)
+
+
+def summarise(mortgage_amount:int, interest_rate:float, mortgage_period:int, total_instalments:int, repayments_oop:dict={}, repayments_mop:dict={}, convention:PaymentConvention=MONTHLY):
+    """
+    Computes the payoff instalment and the totals without building the schedule.
+
+    Each segment of constant payment is resolved with the closed-form annuity
+    balance and its logarithm, so the cost depends on the number of
+    overpayment events rather than on the length of the term. With another
+    convention than MONTHLY, the months are instalment periods of that
+    convention, and so are the months of the overpayments.
+
+    Returns
+    -------
+    int, float, float
+        Last instalment, total paid and total interest charged.
+
+    """
+    monthly_payment = convention.payment(mortgage_amount,interest_rate,mortgage_period)
+    remaining_principal = mortgage_amount
+    payment_to_date = 0
+    for start, end, payment in payment_segments(monthly_payment, total_instalments, repayments_oop, repayments_mop):
+        month = payoff_month(remaining_principal, payment, interest_rate, end - start, convention)
+        payment_to_date += payment*month
+        remaining_principal = balance_after(remaining_principal, payment, interest_rate, month, convention)
+        if month < end - start:
+            last_payment = remaining_principal + convention.interest(remaining_principal, interest_rate)
+            payment_to_date += last_payment
+            return start + month + 1, float(payment_to_date), float(payment_to_date - mortgage_amount)
+    return total_instalments, float(payment_to_date), float(payment_to_date - mortgage_amount + remaining_principal)
+
+
+def _running_total(values:np.ndarray, start:float)->np.ndarray:
+    """Cumulative sum continuing from start, added in the same order as a month-by-month loop"""
+    return np.cumsum(np.concatenate(([start], values)))[1:]
+
+
+def amortize(mortgage_amount:int, interest_rate:float, mortgage_period:int, total_instalments:int, repayments_oop:dict={}, repayments_mop:dict={}, checkpoint:tuple=None, convention:PaymentConvention=MONTHLY):
+    """
+    Computes the full schedule on float64 arrays.
+
+    The term is split into segments of constant payment at every overpayment
+    event, and the balances of each segment are obtained in closed form from
+    the annuity recurrence instead of month by month.
+
+    Parameters
+    ----------
+    mortgage_amount : int
+        Amount borrowed.
+    interest_rate : float
+        interest rate in percentage.
+    mortgage_period : int
+        Lenght of mortgage in years.
+    total_instalments : int
+        Number of repayments (typically months).
+    repayments_oop : dict
+        One-off overpayments, month -> amount added to that month's payment.
+    repayments_mop : dict or RecurringRepayments
+        Increased payments, month -> amount replacing that month's payment.
+    checkpoint : tuple, optional
+        (month, remaining principal, paid to date, interest charged to date,
+        principal repaid to date) after a given month: the schedule is then
+        only computed for the following months.
+    convention : PaymentConvention
+        Payment frequency and interest accrual (monthly by default); the
+        months are then the instalment periods of the convention.
+
+    Returns
+    -------
+    dict, int, float
+        Columns of the schedule as arrays, last instalment and total paid.
+
+    """
+    monthly_payment = convention.payment(mortgage_amount,interest_rate,mortgage_period)
+    payment, one_off, increased = planned_payments(monthly_payment, total_instalments, repayments_oop, repayments_mop)
+
+    first_month, remaining_principal, *to_date = checkpoint or (0, mortgage_amount, 0.0, 0.0, 0.0)
+    payment, one_off, increased = payment[first_month:], one_off[first_month:], increased[first_month:]
+
+    starts = segment_starts(payment)
+    balance = np.empty(len(payment), dtype=np.float64)
+    months = len(payment)
+    for start, end in zip(starts[:-1], starts[1:]):
+        balances = segment_balances(remaining_principal, payment[start], interest_rate, end - start, convention)
+        balance[start:end] = balances[:-1]
+        paid_off = np.flatnonzero(balances[:-1] <= payment[start])
+        if len(paid_off):
+            months = start + paid_off[0] + 1
+            break
+        remaining_principal = balances[-1]
+
+    principal_to_date = balance[:months]
+    interest_charged = convention.interest(principal_to_date, interest_rate)
+    this_month_payment = payment[:months].copy()
+    if principal_to_date[-1] <= this_month_payment[-1]:
+        this_month_payment[-1] = principal_to_date[-1] + interest_charged[-1]
+    principal_repaid = this_month_payment - interest_charged
+
+    schedule = {COLUMNS[0]:principal_to_date,
+                COLUMNS[1]:this_month_payment,
+                COLUMNS[2]:_running_total(this_month_payment, to_date[0]),
+                COLUMNS[3]:interest_charged,
+                COLUMNS[4]:_running_total(interest_charged, to_date[1]),
+                COLUMNS[5]:principal_repaid,
+                COLUMNS[6]:_running_total(principal_repaid, to_date[2]),
+                COLUMNS[7]:principal_to_date - principal_repaid,
+                COLUMNS[8]:one_off[:months],
+                COLUMNS[9]:increased[:months],
+                }
+    instalment = first_month + months
+    return schedule, instalment, float(schedule[COLUMNS[2]][-1])
+
+
+def batch_payments(mortgage_amounts:np.ndarray, interest_rates:np.ndarray, mortgage_periods:np.ndarray)->np.ndarray:
+    """Computes the montly payment cost of many loans at once, rounded like payments() (a loan at 0% repays the same amount every month)"""
+    rates = np.where(interest_rates > 0.25, interest_rates/100, interest_rates)
+    temp = np.power(1 + rates/12, mortgage_periods*12)
+    interest_free = rates == 0
+    monthly_payment = np.where(interest_free, mortgage_amounts/(mortgage_periods*12), mortgage_amounts*(rates*temp/12)/np.where(interest_free, 1, temp - 1))
+    return np.array([approx(value) for value in monthly_payment.tolist()], dtype=np.float64)
+
+
+def _batch_chunk(mortgage_amounts, interest_rates, mortgage_periods, repayments_oop, repayments_mop, full_schedules):
+    """Amortizes one chunk of loans month by month, with every operation applied to all the loans of the chunk"""
+    loans = len(mortgage_amounts)
+    total_instalments = mortgage_periods*12
+    months = int(total_instalments.max()) if loans else 0
+    monthly_payment = batch_payments(mortgage_amounts, interest_rates, mortgage_periods)
+    rates = np.where(interest_rates > 0.25, interest_rates/100, interest_rates)
+
+    payment = np.repeat(monthly_payment[:, None], months, axis=1)
+    one_off = np.zeros((loans, months), dtype=bool)
+    increased = np.zeros((loans, months), dtype=bool)
+    for loan in range(loans):
+        limit = total_instalments[loan]
+        if not repayments_mop[loan] and not repayments_oop[loan]:
+            continue
+        for start, end, amount in as_recurring(repayments_mop[loan] or {}).intervals():
+            start, end = max(start, 1), min(end, limit)
+            if start <= end:
+                payment[loan, start-1:end] = amount
+                increased[loan, start-1:end] = True
+        for month, amount in (repayments_oop[loan] or {}).items():
+            if 1 <= month <= limit:
+                payment[loan, month-1] += amount
+                one_off[loan, month-1] = True
+
+    balance = mortgage_amounts.astype(np.float64)
+    payment_to_date = np.zeros(loans)
+    interest_paid_to_date = np.zeros(loans)
+    principal_repaid_to_date = np.zeros(loans)
+    instalments = total_instalments.copy()
+    done = np.zeros(loans, dtype=bool)
+    if full_schedules:
+        schedule = {column:np.full((loans, months), np.nan) for column in COLUMNS[:8]}
+    for month in range(months):
+        active = ~done & (month < total_instalments)
+        if not active.any():
+            break
+        interest_charged = np.where(active, balance*rates/12, 0.0)
+        this_month_payment = payment[:, month]
+        paid_off = active & (balance <= this_month_payment)
+        this_month_payment = np.where(paid_off, balance + interest_charged, np.where(active, this_month_payment, 0.0))
+        principal_repaid = this_month_payment - interest_charged
+        payment_to_date += this_month_payment
+        interest_paid_to_date += interest_charged
+        principal_repaid_to_date += principal_repaid
+        if full_schedules:
+            for column, values in zip(COLUMNS[:8], (balance, this_month_payment, payment_to_date, interest_charged, interest_paid_to_date, principal_repaid, principal_repaid_to_date, balance - principal_repaid)):
+                schedule[column][active, month] = values[active]
+        balance = balance - principal_repaid
+        instalments[paid_off] = month + 1
+        done |= paid_off
+
+    summary = {'Monthly payment':monthly_payment,
+               'Instalments':instalments,
+               'Total paid':payment_to_date,
+               'Total interest':interest_paid_to_date,
+               }
+    if not full_schedules:
+        return summary, None
+    active = np.arange(months) < instalments[:, None]
+    schedule[COLUMNS[8]] = one_off & active
+    schedule[COLUMNS[9]] = increased & active
+    return summary, schedule
+
+
+def iter_batch(mortgage_amounts, interest_rates, mortgage_periods, repayments_oop=None, repayments_mop=None, full_schedules:bool=False, chunk_size:int=4096):
+    """
+    Amortizes a book of loans, one chunk at a time.
+
+    Parameters
+    ----------
+    mortgage_amounts, interest_rates, mortgage_periods : array-like
+        One value per loan, as for payments().
+    repayments_oop, repayments_mop : sequence, optional
+        One overpayment schedule (or None) per loan, as for amortize().
+    full_schedules : bool
+        Whether to also produce the monthly schedules.
+    chunk_size : int
+        Number of loans amortized together, which bounds the memory used.
+
+    Yields
+    ------
+    int, dict, dict
+        Index of the first loan of the chunk, the per-loan summary and, if
+        requested, the schedules as (loans x months) arrays padded with NaN.
+
+    """
+    mortgage_amounts = np.asarray(mortgage_amounts, dtype=np.float64)
+    interest_rates = np.asarray(interest_rates, dtype=np.float64)
+    mortgage_periods = np.asarray(mortgage_periods, dtype=np.int64)
+    loans = len(mortgage_amounts)
+    repayments_oop = [None]*loans if repayments_oop is None else repayments_oop
+    repayments_mop = [None]*loans if repayments_mop is None else repayments_mop
+    for start in range(0, loans, chunk_size):
+        end = min(start + chunk_size, loans)
+        summary, schedule = _batch_chunk(mortgage_amounts[start:end], interest_rates[start:end], mortgage_periods[start:end],
+                                         repayments_oop[start:end], repayments_mop[start:end], full_schedules)
+        yield start, summary, schedule
+
+
+def calculate_batch(mortgage_amounts, interest_rates, mortgage_periods, repayments_oop=None, repayments_mop=None, chunk_size:int=4096)->dict:
+    """Computes the per-loan summaries (monthly payment, instalments to payoff, total paid and total interest) of a book of loans"""
+    chunks = [summary for _, summary, _ in iter_batch(mortgage_amounts, interest_rates, mortgage_periods, repayments_oop, repayments_mop, chunk_size=chunk_size)]
+    if not chunks:
+        return {key:np.empty(0) for key in ('Monthly payment', 'Instalments', 'Total paid', 'Total interest')}
+    return {key:np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
@@ -0,0 +1,138 @@
+## This file contains the streaming export of the schedules to CSV, Parquet and Excel
+
+import csv
+import io
+import json
+
+import numpy as np
+
+from engine import COLUMNS, iter_batch
+from schedules import as_recurring
+
+BLOCK_SIZE = 4096
+MONEY_FORMAT = '#,##0.00'
+
+
+def schedule_blocks(schedule:dict, instalment:int, columns:list=COLUMNS, block_size:int=BLOCK_SIZE):
+    """Splits a schedule computed by the engine into blocks of rows, each a dictionary of column arrays starting with the Instalment"""
+    for start in range(0, instalment, block_size):
+        end = min(start + block_size, instalment)
+        block = {'Instalment':np.arange(start + 1, end + 1)}
+        block.update({column:schedule[column][start:end] for column in columns})
+        yield block
+
+
+def batch_blocks(mortgage_amounts, interest_rates, mortgage_periods, repayments_oop=None, repayments_mop=None, full_schedules:bool=False, chunk_size:int=4096, loan_ids=None):
+    """Streams a book of loans from engine.iter_batch as blocks of rows: one per loan, or one per loan and instalment with full_schedules"""
+    for first, summary, schedule in iter_batch(mortgage_amounts, interest_rates, mortgage_periods, repayments_oop, repayments_mop, full_schedules, chunk_size):
+        loans = np.arange(first, first + len(summary['Instalments'])) if loan_ids is None else np.asarray(loan_ids[first:first + len(summary['Instalments'])])
+        if not full_schedules:
+            yield {'Loan':loans, **summary}
+            continue
+        paid = ~np.isnan(schedule[COLUMNS[0]])
+        loan, month = np.nonzero(paid)
+        block = {'Loan':loans[loan], 'Instalment':month + 1}
+        block.update({column:schedule[column][paid] for column in COLUMNS})
+        yield block
+
+
+def records_block(records:list)->dict:
+    """Turns a short list of dictionaries (summaries, plans, scenarios) into a single block"""
+    return {key:[record[key] for record in records] for key in (records[0] if records else {})}
+
+
+def plan_block(repayments_oop:dict={}, repayments_mop:dict={})->dict:
+    """The overpayment plan as a block: one row per one-off payment and per recurring period"""
+    records = [{'Type':'One-off', 'Start':month, 'End':month, 'Payment':amount} for month, amount in sorted(repayments_oop.items())]
+    records += [{'Type':'Recurring', 'Start':start, 'End':end, 'Payment':amount} for start, end, amount in as_recurring(repayments_mop).intervals()]
+    return records_block(records) or {'Type':[], 'Start':[], 'End':[], 'Payment':[]}
+
+
+def _rows(block:dict):
+    """Iterates over the rows of a block as tuples of Python values"""
+    return zip(*(values.tolist() if isinstance(values, np.ndarray) else values for values in block.values()))
+
+
+def write_csv(file, blocks):
+    """Writes the blocks to a binary file as CSV, one block at a time"""
+    text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    header = False
+    for block in blocks:
+        if not header:
+            writer.writerow(block.keys())
+            header = True
+        writer.writerows(_rows(block))
+    text.flush()
+    text.detach()
+
+
+def write_jsonl(file, blocks):
+    """Writes the blocks to a binary file as JSON lines, one object per row"""
+    text = io.TextIOWrapper(file, encoding='utf-8')
+    for block in blocks:
+        keys = list(block)
+        for values in _rows(block):
+            text.write(json.dumps(dict(zip(keys, values))) + '\n')
+    text.flush()
+    text.detach()
+
+
+def write_parquet(file, blocks):
+    """Writes the blocks to a binary file as Parquet, one row group per block"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    for block in blocks:
+        table = pa.Table.from_pydict({key:np.asarray(values) for key, values in block.items()})
+        if writer is None:
+            writer = pq.ParquetWriter(file, table.schema)
+        writer.write_table(table)
+    if writer is not None:
+        writer.close()
+
+
+def write_xlsx(file, sheets:list):
+    """
+    Writes a workbook with xlsxwriter in constant_memory mode, so that each row
+    is flushed to disk as soon as the next one starts.
+
+    Parameters
+    ----------
+    file : str or file
+        Where to save the workbook.
+    sheets : list
+        (name, blocks) pairs, written one sheet after the other.
+
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(file, {'constant_memory':True, 'nan_inf_to_errors':True})
+    money = workbook.add_format({'num_format':MONEY_FORMAT})
+    bold = workbook.add_format({'bold':True})
+    for name, blocks in sheets:
+        worksheet = workbook.add_worksheet(name)
+        row = 0
+        for block in blocks:
+            if row == 0:
+                worksheet.write_row(0, 0, list(block.keys()), bold)
+                row = 1
+            for values in _rows(block):
+                for col, value in enumerate(values):
+                    worksheet.write(row, col, value, money if isinstance(value, float) else None)
+                row += 1
+    workbook.close()
+
+
+def write_workbook(file, schedule:dict, instalment:int, columns:list, summary:dict, repayments_oop:dict={}, repayments_mop:dict={}, scenarios:list=None):
+    """Writes the multi-sheet analysis: schedule, summary, overpayment plan and, if given, the scenario comparisons"""
+    sheets = [('Schedule', schedule_blocks(schedule, instalment, columns)),
+              ('Summary', [records_block([{'Item':key, 'Value':value} for key, value in summary.items()])]),
+              ('Overpayment plan', [plan_block(repayments_oop, repayments_mop)])]
+    if scenarios:
+        sheets.append(('Scenarios', [records_block(scenarios)]))
+    write_xlsx(file, sheets)
+
+
+WRITERS = {'csv':write_csv, 'jsonl':write_jsonl, 'parquet':write_parquet}
@@ -0,0 +1,167 @@
+## This file contains the Monte Carlo simulation of variable and tracker rate mortgages
+
+import numpy as np
+
+PERCENTILES = (5, 25, 50, 75, 95)
+PAYMENT_BINS = 5000
+
+
+def step_rate_path(interest_rate:float, total_instalments:int, changes:dict={})->np.ndarray:
+    """A user-defined path: the rate starts at interest_rate and is reset to changes[month] from that month on"""
+    path = np.full(total_instalments, interest_rate, dtype=np.float64)
+    for month, rate in sorted(changes.items()):
+        path[max(month, 1)-1:] = rate
+    return path
+
+
+def mean_reverting_paths(interest_rate:float, total_instalments:int, paths:int, long_term_rate:float, speed:float=0.5, volatility:float=1.0,
+                         reset_every:int=1, floor:float=0.0, chunk_size:int=10000, seed:int=None):
+    """
+    Generates stochastic rate paths (in percentage) from a mean-reverting
+    (Ornstein-Uhlenbeck) process, one chunk of paths at a time.
+
+    Parameters
+    ----------
+    interest_rate : float
+        Rate of the first month.
+    long_term_rate : float
+        Level the rate reverts to.
+    speed : float
+        Speed of the reversion, per year.
+    volatility : float
+        Annual volatility of the rate, in percentage points.
+    reset_every : int
+        Months between two rate resets, the rate being held in between.
+    floor : float
+        Lowest rate allowed.
+
+    Yields
+    ------
+    ndarray
+        (paths x months) rates, at most chunk_size paths at a time.
+
+    """
+    rng = np.random.default_rng(seed)
+    dt = reset_every/12
+    resets = np.arange(total_instalments)//reset_every
+    for start in range(0, paths, chunk_size):
+        size = min(chunk_size, paths - start)
+        shocks = rng.standard_normal((size, resets[-1]))
+        levels = np.empty((size, resets[-1] + 1))
+        levels[:, 0] = interest_rate
+        for step in range(resets[-1]):
+            levels[:, step+1] = np.maximum(levels[:, step] + speed*(long_term_rate - levels[:, step])*dt + volatility*np.sqrt(dt)*shocks[:, step], floor)
+        yield levels[:, resets]
+
+
+def _simulate_chunk(mortgage_amount:float, rate_paths:np.ndarray, overpayment:float):
+    """Amortizes a chunk of rate paths together, recomputing the payment over the remaining term at every rate reset"""
+    paths, months = rate_paths.shape
+    # the paths are always in percentage: a rate of 0.2 is 0.2%, not 20%
+    rates = np.asarray(rate_paths, dtype=np.float64)/100/12
+    balance = np.full(paths, mortgage_amount, dtype=np.float64)
+    payment = np.zeros(paths)
+    monthly_payment = np.full((paths, months), np.nan)
+    interest_paid_to_date = np.zeros(paths)
+    instalments = np.full(paths, months)
+    active = np.ones(paths, dtype=bool)
+    for month in range(months):
+        rate = rates[:, month]
+        reset = active & ((rate != rates[:, month-1]) if month else True)
+        if reset.any():
+            remaining = months - month
+            growth = np.power(1 + rate[reset], remaining)
+            annuity = np.where(rate[reset] > 0, balance[reset]*rate[reset]*growth/np.where(growth > 1, growth - 1, 1), balance[reset]/remaining)
+            payment[reset] = np.round(annuity, 2)
+        interest_charged = balance*rate
+        this_month_payment = payment + overpayment
+        paid_off = active & (balance <= this_month_payment)
+        this_month_payment = np.where(paid_off, balance + interest_charged, this_month_payment)
+        monthly_payment[active, month] = this_month_payment[active]
+        interest_paid_to_date[active] += interest_charged[active]
+        balance = np.where(active, balance - (this_month_payment - interest_charged), balance)
+        instalments[paid_off] = month + 1
+        active &= ~paid_off
+        if not active.any():
+            break
+    return monthly_payment, interest_paid_to_date, instalments
+
+
+def simulate(mortgage_amount:float, rate_paths, overpayment:float=0.0, chunk_size:int=10000, percentiles:tuple=PERCENTILES)->dict:
+    """
+    Simulates a mortgage over many rate paths and summarises the outcomes as
+    percentile bands.
+
+    Parameters
+    ----------
+    mortgage_amount : float
+        Amount borrowed.
+    rate_paths : ndarray or iterable of ndarray
+        Rates in percentage, one row per path and one column per month (the
+        term), either as one array or as chunks such as those yielded by
+        mean_reverting_paths(). A single path can be given as a 1-D array.
+    overpayment : float
+        Amount paid every month on top of the payment.
+    chunk_size : int
+        Paths amortized together when rate_paths is a single array.
+    percentiles : tuple
+        Percentiles of the bands.
+
+    Returns
+    -------
+    dict
+        'Monthly payment': (percentiles x months) bands of the payment among
+        the loans still running, from a histogram of 1/1000th of the first
+        payment per bin (payments above the PAYMENT_BINS bins are kept
+        exactly, so a band falling among them is an exact payment rather than
+        a bin); 'Total interest' and 'Instalments': the percentiles over all
+        the paths; 'Paths': the number of paths.
+
+    """
+    if isinstance(rate_paths, np.ndarray):
+        paths = np.atleast_2d(rate_paths)
+        rate_paths = (paths[start:start + chunk_size] for start in range(0, len(paths), chunk_size))
+
+    counts = None
+    interest, instalments = [], []
+    overflow_months, overflow_payments = [], []
+    for chunk in rate_paths:
+        monthly_payment, interest_charged, paid_off = _simulate_chunk(mortgage_amount, chunk, overpayment)
+        if counts is None:
+            months = chunk.shape[1]
+            width = np.nanmedian(monthly_payment[:, 0])/1000
+            counts = np.zeros((months, PAYMENT_BINS), dtype=np.int64)
+        running = ~np.isnan(monthly_payment)
+        month = np.nonzero(running)[1]
+        payment = monthly_payment[running]
+        bins = (payment/width).astype(np.int64)
+        outside = bins >= PAYMENT_BINS
+        overflow_months.append(month[outside])
+        overflow_payments.append(payment[outside])
+        counts += np.bincount(month[~outside]*PAYMENT_BINS + bins[~outside], minlength=months*PAYMENT_BINS).reshape(months, PAYMENT_BINS)
+        interest.append(interest_charged)
+        instalments.append(paid_off)
+
+    interest, instalments = np.concatenate(interest), np.concatenate(instalments)
+    cumulative = np.cumsum(counts, axis=1)
+    in_bins = cumulative[:, -1]
+    overflow_months, overflow_payments = np.concatenate(overflow_months), np.concatenate(overflow_payments)
+    order = np.lexsort((overflow_payments, overflow_months))
+    overflow_payments = overflow_payments[order]
+    overflow_counts = np.bincount(overflow_months, minlength=len(in_bins))
+    overflow_first = np.concatenate(([0], np.cumsum(overflow_counts)[:-1]))
+    totals = in_bins + overflow_counts
+    bands = np.full((len(percentiles), counts.shape[0]), np.nan)
+    for row, percentile in enumerate(percentiles):
+        target = np.maximum(totals*percentile/100, 1)
+        rank = np.argmax(cumulative >= target[:, None], axis=1)
+        bands[row] = np.where(totals > 0, (rank + 0.5)*width, np.nan)
+        # the percentile lies above the histogram: it is read from the exact payments of that month
+        above = (totals > 0) & (in_bins < target)
+        position = np.ceil(target[above]).astype(np.int64) - in_bins[above] - 1
+        bands[row, above] = overflow_payments[overflow_first[above] + position]
+    return {'Monthly payment':bands,
+            'Total interest':np.percentile(interest, percentiles),
+            'Instalments':np.percentile(instalments, percentiles),
+            'Paths':len(interest),
+            }
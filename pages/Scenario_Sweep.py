@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import streamlit as st
+import altair as alt
+import numpy as np
+
+from miscellaneous import clean
+from sweep import sweep
+
+def local(file_name):
+    with open(file_name) as f:
+        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+
+local('assets/css/bootstrap.min.css')
+
+st.title('Compare Rates, Terms and Overpayments')
+
+with st.sidebar:
+    st.title('Grid')
+    mortgage_amount = st.text_input("Mortgage Amount", "250000")
+    rates = st.slider("Interest Rate (%)", 0.5, 15.0, (2.0, 7.0), 0.5)
+    rate_step = st.text_input("Interest Rate step (%)", "0.25")
+    periods = st.slider("Mortgage Period (in years)", 5, 50, (10, 40))
+    overpayments = st.text_input("Monthly overpayments (comma separated)", "0, 100, 250, 500")
+    submitted = st.button("Compare")
+
+if submitted:
+    interest_rates = np.round(np.arange(rates[0], rates[1] + 1e-9, float(rate_step)), 4)
+    overpayment_levels = [float(level) for level in overpayments.split(',') if level.strip()]
+    st.session_state.sweep = sweep(float(mortgage_amount), interest_rates, range(periods[0], periods[1]+1), overpayment_levels)
+
+if 'sweep' in st.session_state:
+    table = st.session_state.sweep
+    st.write(f"{len(table):,} scenarios evaluated.")
+
+    metric = st.selectbox("Measure", ("Total interest", "Total paid", "Monthly payment", "Instalments", "Months saved", "Interest saved"))
+    level = st.selectbox("Monthly overpayment", sorted(table['Overpayment'].unique()), format_func=clean)
+    cells = table[table['Overpayment'] == level]
+
+    heatmap = alt.Chart(cells).mark_rect().encode(
+        x=alt.X('Mortgage period:O', title='Mortgage period (years)'),
+        y=alt.Y('Interest rate:O', title='Interest rate (%)', sort='descending'),
+        color=alt.Color(f'{metric}:Q', scale=alt.Scale(scheme='viridis')),
+        tooltip=['Interest rate', 'Mortgage period', 'Monthly payment', 'Instalments', 'Total paid', 'Total interest', 'Months saved', 'Interest saved'])
+    st.altair_chart(heatmap)
+
+    st.write("### All scenarios")
+    st.dataframe(table)
@@ -0,0 +1,170 @@
+## This file contains the overpayment plans entered in the web app: append-friendly rows and bulk import
+
+import io
+
+import numpy as np
+
+from schedules import RecurringRepayments
+
+ONE_OFF_COLUMNS = ('Payment', 'Month')
+RECURRING_COLUMNS = ('Payment', 'Start', 'End')
+PLAN_TYPES = ('one-off', 'recurring')
+MAX_ERRORS = 10
+
+
+class PlanRows:
+    """
+    Rows of an overpayment table kept as one list per column.
+
+    Adding a row appends to the lists instead of copying the whole table, and
+    the DataFrame is only built when the table is displayed.
+    """
+
+    def __init__(self, columns:tuple):
+        self.columns = {column:[] for column in columns}
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def append(self, **row):
+        """Adds one row, given as column=value"""
+        for column, values in self.columns.items():
+            values.append(row[column])
+
+    def extend(self, **columns):
+        """Adds many rows, given as column=sequence of values"""
+        for column, values in self.columns.items():
+            values.extend(columns[column])
+
+    def pop(self):
+        """Removes the last row, if any"""
+        if len(self):
+            for values in self.columns.values():
+                values.pop()
+
+    def frame(self):
+        """The rows as a DataFrame, for display and edition (pandas is only imported here)"""
+        import pandas as pd
+
+        return pd.DataFrame({column:pd.Series(values, dtype='float64') for column, values in self.columns.items()})
+
+    def update(self, frame):
+        """Takes the rows back from an edited DataFrame"""
+        self.columns = {column:frame[column].tolist() for column in self.columns}
+
+    def array(self, column:str)->np.ndarray:
+        """One column as an array of floats, NaN where the value is missing"""
+        return np.asarray(self.columns[column], dtype=np.float64)
+
+
+def number(value)->float:
+    """Reads a number typed in a text box (NaN if it is not one)"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def one_off_repayments(rows:PlanRows)->dict:
+    """The one-off payments month -> amount of the table, a later row replacing an earlier one for the same month"""
+    months, amounts = rows.array('Month'), rows.array('Payment')
+    entered = ~(np.isnan(months) | np.isnan(amounts))
+    return dict(zip(months[entered].astype(np.int64).tolist(), amounts[entered].tolist()))
+
+
+def recurring_repayments(rows:PlanRows)->RecurringRepayments:
+    """The recurring payments of the table (overlapping periods resolved as RecurringRepayments.from_arrays does)"""
+    starts, ends, amounts = rows.array('Start'), rows.array('End'), rows.array('Payment')
+    entered = ~(np.isnan(starts) | np.isnan(ends) | np.isnan(amounts))
+    return RecurringRepayments.from_arrays(starts[entered].astype(np.int64), ends[entered].astype(np.int64), amounts[entered])
+
+
+def _no_rows()->tuple:
+    """Empty one-off and recurring rows"""
+    return {column:[] for column in ONE_OFF_COLUMNS}, {column:[] for column in RECURRING_COLUMNS}
+
+
+def _row_errors(rows:np.ndarray, message:str)->list:
+    """One message per invalid row (rows numbered from 1 after the header), up to MAX_ERRORS"""
+    return [f"ERROR: Row {row}, {message}" for row in (rows[:MAX_ERRORS] + 1).tolist()]
+
+
+def parse_plan(source, one_off:PlanRows=None, recurring:PlanRows=None)->tuple:
+    """
+    Reads and validates, in one vectorised pass, a CSV of one-off and recurring
+    overpayments, such as the Overpayment plan sheet of the Excel export.
+
+    The columns are Payment, Start and End (Month can be used for Start), and
+    optionally Type ('One-off' or 'Recurring', in any case, any other value
+    being an error). Without Type, the rows with an End are recurring
+    payments and the others one-off payments. The recurring payments must not
+    overlap each other nor those already in recurring (the rules of
+    check_recurring_repayments), and a month can only have one one-off
+    payment.
+
+    Parameters
+    ----------
+    source : str or file
+        CSV text or file object.
+    one_off, recurring : PlanRows, optional
+        Rows already entered, checked together with the imported ones.
+
+    Returns
+    -------
+    dict, dict, list
+        The one-off rows {'Payment':[...], 'Month':[...]}, the recurring rows
+        {'Payment':[...], 'Start':[...], 'End':[...]} and the errors; nothing
+        is returned (empty rows) when there is any error.
+
+    """
+    import pandas as pd
+
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    try:
+        table = pd.read_csv(source, skipinitialspace=True)
+    except (pd.errors.EmptyDataError, pd.errors.ParserError) as error:
+        return (*_no_rows(), [f"ERROR: The file could not be read as CSV ({error})"])
+    table.columns = [str(column).strip().capitalize() for column in table.columns]
+    if 'Start' not in table.columns and 'Month' in table.columns:
+        table = table.rename(columns={'Month':'Start'})
+    missing = [column for column in ('Payment', 'Start') if column not in table.columns]
+    if missing:
+        return (*_no_rows(), [f"ERROR: Missing column(s) {', '.join(missing)}"])
+
+    payment = pd.to_numeric(table['Payment'], errors='coerce').to_numpy(dtype=np.float64)
+    start = pd.to_numeric(table['Start'], errors='coerce').to_numpy(dtype=np.float64)
+    end = pd.to_numeric(table['End'], errors='coerce').to_numpy(dtype=np.float64) if 'End' in table.columns else np.full(len(table), np.nan)
+    errors = []
+    if 'Type' in table.columns:
+        plan_type = table['Type'].astype(str).str.strip().str.lower().to_numpy()
+        errors += _row_errors(np.flatnonzero(~np.isin(plan_type, PLAN_TYPES)), "the type must be One-off or Recurring")
+        is_recurring = plan_type == 'recurring'
+        end = np.where(is_recurring, end, start)
+    else:
+        is_recurring = ~np.isnan(end)
+
+    errors += _row_errors(np.flatnonzero(~(payment > 0)), "the payment must be a positive amount")
+    errors += _row_errors(np.flatnonzero(~(start >= 1) | (start % 1 != 0)), "the month must be a whole number from 1")
+    errors += _row_errors(np.flatnonzero(is_recurring & (np.isnan(end) | (end % 1 != 0))), "a recurring payment needs a whole End month")
+    months = start[~is_recurring]
+    repeated = np.flatnonzero(~is_recurring)[pd.Series(months).duplicated(keep=False).to_numpy() & ~np.isnan(months)]
+    errors += _row_errors(repeated, "there is already a one-off payment on this month")
+    if one_off is not None and len(one_off):
+        errors += _row_errors(np.flatnonzero(~is_recurring & np.isin(start, one_off.array('Month'))), "a one-off payment was already entered for this month")
+    if errors:
+        return (*_no_rows(), errors)
+
+    starts, ends, amounts = start[is_recurring].astype(np.int64), end[is_recurring].astype(np.int64), payment[is_recurring]
+    if recurring is not None and len(recurring):
+        entered = ~np.isnan(recurring.array('Start')) & ~np.isnan(recurring.array('End'))
+        starts = np.concatenate((starts, recurring.array('Start')[entered].astype(np.int64)))
+        ends = np.concatenate((ends, recurring.array('End')[entered].astype(np.int64)))
+        amounts = np.concatenate((amounts, recurring.array('Payment')[entered]))
+    error = RecurringRepayments(starts, ends, amounts).validate()
+    if error is not None:
+        return (*_no_rows(), [error])
+
+    return ({'Payment':payment[~is_recurring].tolist(), 'Month':start[~is_recurring].astype(np.int64).tolist()},
+            {'Payment':payment[is_recurring].tolist(), 'Start':start[is_recurring].astype(np.int64).tolist(), 'End':end[is_recurring].astype(np.int64).tolist()},
+            [])
@@ -0,0 +1,115 @@
+## This file contains the compact representation of the recurring repayments
+
+from collections.abc import Mapping
+
+import numpy as np
+
+
+class RecurringRepayments(Mapping):
+    """
+    Recurring repayments stored as sorted, non-overlapping intervals of months.
+
+    Each interval (start, end, amount) means that the monthly payment is set
+    to amount from month start to month end, both included. The intervals are
+    kept in three arrays, so memory does not grow with the length of the
+    periods, and a month is looked up with a binary search. It behaves as the
+    read-only dictionary month -> amount returned by convert_recurring_repayments.
+    """
+
+    def __init__(self, starts=(), ends=(), amounts=()):
+        order = np.argsort(np.asarray(starts, dtype=np.int64), kind='stable')
+        self.starts = np.asarray(starts, dtype=np.int64)[order]
+        self.ends = np.asarray(ends, dtype=np.int64)[order]
+        self.amounts = np.asarray(amounts, dtype=np.float64)[order]
+
+    @classmethod
+    def from_arrays(cls, starts, ends, amounts):
+        """Builds the schedule from the periods as columns; overlapping periods are resolved as the dictionary expansion would (the later one wins)"""
+        schedule = cls(starts, ends, amounts)
+        if schedule.validate() is None:
+            return schedule
+        return cls.from_dict({month:amount for start, end, amount in zip(np.asarray(starts).tolist(), np.asarray(ends).tolist(), np.asarray(amounts, dtype=np.float64).tolist())
+                              for month in range(start, end+1)})
+
+    @classmethod
+    def from_periods(cls, periods:list):
+        """Builds the schedule from the list of periods used by check_recurring_repayments"""
+        return cls.from_arrays([period["start"] for period in periods], [period["end"] for period in periods], [period["amount_paid"] for period in periods])
+
+    @classmethod
+    def from_intervals(cls, intervals:tuple):
+        """Builds the schedule back from the tuples returned by intervals()"""
+        return cls(*zip(*intervals)) if intervals else cls()
+
+    @classmethod
+    def from_dict(cls, repayments:dict):
+        """Compresses a dictionary month -> amount into runs of consecutive months with the same amount"""
+        if len(repayments) == 0:
+            return cls()
+        months = np.fromiter(repayments.keys(), dtype=np.int64, count=len(repayments))
+        amounts = np.fromiter(repayments.values(), dtype=np.float64, count=len(repayments))
+        order = np.argsort(months)
+        months, amounts = months[order], amounts[order]
+        new_run = np.concatenate(([True], (np.diff(months) != 1) | (np.diff(amounts) != 0)))
+        firsts = np.flatnonzero(new_run)
+        lasts = np.concatenate((firsts[1:], [len(months)])) - 1
+        return cls(months[firsts], months[lasts], amounts[firsts])
+
+    def validate(self)->str:
+        """Returns the error for the first period that ends before it starts or clashes with the next one (None if they are all fine)"""
+        wrong = np.flatnonzero(self.ends < self.starts)
+        clash = np.flatnonzero(self.starts[1:] <= self.ends[:-1])
+        if len(wrong) and (len(clash) == 0 or wrong[0] <= clash[0]):
+            idx = wrong[0]
+            return f"ERROR: For a time period set in repayments the end date (Month {self.ends[idx]}) preceeds the start date (Month {self.starts[idx]})"
+        if len(clash):
+            idx = clash[0]
+            return f"ERROR: There is a clash between repayment periods. A new period starts (Month {self.starts[idx+1]}) before another ends (Month {self.ends[idx]})"
+        return None
+
+    def lookup(self, months)->np.ndarray:
+        """Looks up many months at once: the amount paid in each of them, NaN where there is no recurring repayment"""
+        months = np.asarray(months, dtype=np.int64)
+        if len(self.starts) == 0:
+            return np.full(months.shape, np.nan)
+        idx = np.searchsorted(self.starts, months, side='right') - 1
+        covered = (idx >= 0) & (months <= self.ends[idx])
+        return np.where(covered, self.amounts[idx], np.nan)
+
+    def intervals(self)->tuple:
+        """The (start, end, amount) intervals, as a hashable tuple"""
+        return tuple(zip(self.starts.tolist(), self.ends.tolist(), self.amounts.tolist()))
+
+    def total(self)->float:
+        """Total amount paid over all the months"""
+        return float(np.sum(self.amounts*(self.ends - self.starts + 1)))
+
+    def first_difference(self, other)->int:
+        """First month in which the two schedules differ (None if they are the same)"""
+        boundaries = np.unique(np.concatenate((self.starts, self.ends + 1, other.starts, other.ends + 1)))
+        mine, theirs = self.lookup(boundaries), other.lookup(boundaries)
+        differ = np.flatnonzero((mine != theirs) & ~(np.isnan(mine) & np.isnan(theirs)))
+        return int(boundaries[differ[0]]) if len(differ) else None
+
+    def __getitem__(self, month):
+        idx = np.searchsorted(self.starts, month, side='right') - 1
+        if idx < 0 or month > self.ends[idx]:
+            raise KeyError(month)
+        return float(self.amounts[idx])
+
+    def __iter__(self):
+        for start, end in zip(self.starts.tolist(), self.ends.tolist()):
+            yield from range(start, end+1)
+
+    def __len__(self):
+        return int(np.sum(self.ends - self.starts + 1))
+
+    def __repr__(self):
+        return f"RecurringRepayments({list(self.intervals())})"
+
+
+def as_recurring(repayments)->RecurringRepayments:
+    """Accepts either a RecurringRepayments or a dictionary month -> amount"""
+    if isinstance(repayments, RecurringRepayments):
+        return repayments
+    return RecurringRepayments.from_dict(repayments)
@@ -0,0 +1,314 @@
+## This file contains the local asyncio HTTP/JSON service exposing the calculator engine
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_runner import parse_one_off, parse_recurring
+from conventions import payment_convention, MONTHLY
+from engine import summarise, amortize, schedule_columns
+from export import schedule_blocks, batch_blocks, write_jsonl
+
+MAX_BODY = 64*1024*1024
+STREAM_CHUNK = 64*1024
+REASONS = {200:'OK', 400:'Bad Request', 404:'Not Found', 405:'Method Not Allowed', 413:'Payload Too Large', 500:'Internal Server Error'}
+
+
+def check_loan(loan:dict)->dict:
+    """Checks the amount, rate, term and overpayments of a loan of a request, raising ValueError (KeyError for a missing field) with the reason"""
+    if not isinstance(loan, dict):
+        raise ValueError("A loan must be a JSON object")
+    if not float(loan['mortgage_amount']) > 0:
+        raise ValueError("mortgage_amount must be a positive amount")
+    if not float(loan['interest_rate']) >= 0:
+        raise ValueError("interest_rate must not be negative")
+    if int(loan['mortgage_period']) < 1:
+        raise ValueError("mortgage_period must be at least 1 year")
+    for field, parse in (('one_off', parse_one_off), ('recurring', parse_recurring)):
+        try:
+            parse(loan.get(field))
+        except (AttributeError, KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"{field} could not be read ({error})")
+    return loan
+
+
+def loan_arguments(loan:dict)->tuple:
+    """Reads a loan of a request, with the same fields as a line of the batch runner plus frequency and accrual, as the arguments of the engine"""
+    check_loan(loan)
+    convention = payment_convention(loan.get('frequency', 'monthly'), loan.get('accrual', 'periodic'))
+    mortgage_period = int(loan['mortgage_period'])
+    return (float(loan['mortgage_amount']), float(loan['interest_rate']), mortgage_period, convention.instalments(mortgage_period),
+            parse_one_off(loan.get('one_off')), parse_recurring(loan.get('recurring')) or {}, convention)
+
+
+def quote(loan:dict)->dict:
+    """Worker: payment, payoff instalment and totals of a loan, without the schedule"""
+    *arguments, convention = loan_arguments(loan)
+    instalment, payment_to_date, interest = summarise(*arguments, convention)
+    return {'payment':convention.payment(*arguments[:3]), 'instalments':instalment, 'total_paid':payment_to_date, 'total_interest':interest}
+
+
+def schedule_lines(loan:dict)->bytes:
+    """Worker: the schedule of a loan as JSON lines, one per instalment"""
+    *arguments, convention = loan_arguments(loan)
+    schedule, instalment, _ = amortize(*arguments, convention=convention)
+    output = io.BytesIO()
+    write_jsonl(output, schedule_blocks(schedule, instalment, schedule_columns(arguments[4], arguments[5])))
+    return output.getvalue()
+
+
+def batch_lines(loans:list, first:int=0)->bytes:
+    """Worker: the summaries of a chunk of monthly loans, amortized together, as JSON lines (loans without an id are numbered from first)"""
+    loan_ids = [loan.get('id', first + position) for position, loan in enumerate(loans)]
+    blocks = batch_blocks([float(loan['mortgage_amount']) for loan in loans],
+                          [float(loan['interest_rate']) for loan in loans],
+                          [int(loan['mortgage_period']) for loan in loans],
+                          [parse_one_off(loan.get('one_off')) for loan in loans],
+                          [parse_recurring(loan.get('recurring')) for loan in loans],
+                          chunk_size=len(loans), loan_ids=loan_ids)
+    output = io.BytesIO()
+    write_jsonl(output, blocks)
+    return output.getvalue()
+
+
+class ResultCache:
+    """
+    LRU cache of the results of the service, shared by all the connections.
+
+    A request identical to one still being computed does not start a second
+    computation: it waits for the same task (the request is coalesced). Only
+    successful results are kept, and the cache is bounded by the bytes of the
+    keys and results it holds: a result larger than max_bytes is answered but
+    not kept. It is only used from the event loop thread, so it needs no lock.
+    """
+
+    def __init__(self, max_bytes:int=64*1024*1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._sizes = {}
+        self._pending = {}
+
+    def stats(self)->dict:
+        """Counters used to size the cache"""
+        return {'hits':self.hits, 'coalesced':self.coalesced, 'misses':self.misses, 'size':len(self._results),
+                'pending':len(self._pending), 'bytes':self.bytes, 'max_bytes':self.max_bytes}
+
+    async def get(self, key, compute):
+        """The result for key, from the cache, from the identical request in flight, or else from the coroutine function compute"""
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.hits += 1
+            return self._results[key]
+        if key in self._pending:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(compute())
+            self._pending[key] = task
+            task.add_done_callback(lambda task: self._store(key, task))
+        # a client that disconnects does not cancel the computation the others wait for
+        return await asyncio.shield(self._pending[key])
+
+    def _store(self, key, task):
+        self._pending.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        size = sum(len(part) for part in key) + (len(result) if isinstance(result, bytes) else len(canonical(result)))
+        if size > self.max_bytes:
+            return
+        self._results[key] = result
+        self._sizes[key] = size
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            oldest, _ = self._results.popitem(last=False)
+            self.bytes -= self._sizes.pop(oldest)
+
+
+class HTTPError(Exception):
+    """An error reported to the client with its status code"""
+
+    def __init__(self, status:int, message:str):
+        super().__init__(message)
+        self.status = status
+
+
+class MortgageService:
+    """
+    Minimal HTTP/1.1 server (keep-alive, JSON bodies) on asyncio streams.
+
+    POST /quote takes a loan and answers with its payment and totals, POST
+    /schedule answers with its schedule as NDJSON, and POST /batch takes
+    {"loans":[...]} of monthly loans and answers with one NDJSON line per
+    loan. GET /stats reports the cache counters and GET /health answers ok.
+    The amortization runs in a pool of processes, so the event loop only
+    parses, routes and sends. The NDJSON answers are computed in full by the
+    workers before being sent in chunks: they are not streamed as the engine
+    produces them.
+    """
+
+    def __init__(self, workers:int=None, cache_bytes:int=64*1024*1024, chunk_size:int=1000):
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.cache = ResultCache(cache_bytes)
+        self.executor = None
+
+    async def run_in_pool(self, function, *arguments):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *arguments)
+
+    async def quote(self, body:dict):
+        check_loan(body)
+        return await self.cache.get(('quote', canonical(body)), lambda: self.run_in_pool(quote, body))
+
+    async def schedule(self, body:dict):
+        check_loan(body)
+        return await self.cache.get(('schedule', canonical(body)), lambda: self.run_in_pool(schedule_lines, body))
+
+    async def batch(self, body:dict):
+        loans = body.get('loans')
+        if not isinstance(loans, list):
+            raise HTTPError(400, "Expected {\"loans\":[...]}")
+        for position, loan in enumerate(loans):
+            try:
+                check_loan(loan)
+                convention = payment_convention(loan.get('frequency', 'monthly'), loan.get('accrual', 'periodic'))
+            except KeyError as error:
+                raise HTTPError(400, f"Loan {position}: missing field {error}")
+            except (TypeError, ValueError) as error:
+                raise HTTPError(400, f"Loan {position}: {error}")
+            if convention != MONTHLY:
+                raise HTTPError(400, f"Loan {position}: /batch only amortizes monthly loans with the periodic accrual, use /quote for the others")
+
+        async def compute():
+            chunks = [self.run_in_pool(batch_lines, loans[first:first + self.chunk_size], first) for first in range(0, len(loans), self.chunk_size)]
+            return b''.join(await asyncio.gather(*chunks))
+        return await self.cache.get(('batch', canonical(body)), compute)
+
+    async def route(self, method:str, path:str, body:bytes):
+        """Answers a request: (status, JSON payload) or (status, NDJSON bytes to stream)"""
+        if path == '/health':
+            return 200, {'status':'ok'}
+        if path == '/stats':
+            return 200, self.cache.stats()
+        endpoints = {'/quote':self.quote, '/schedule':self.schedule, '/batch':self.batch}
+        if path not in endpoints:
+            raise HTTPError(404, f"Unknown endpoint {path}, use one of {', '.join(endpoints)}")
+        if method != 'POST':
+            raise HTTPError(405, f"Use POST for {path}")
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError as error:
+            raise HTTPError(400, f"Invalid JSON: {error}")
+        if not isinstance(request, dict):
+            raise HTTPError(400, "Expected a JSON object")
+        try:
+            return 200, await endpoints[path](request)
+        except KeyError as error:
+            raise HTTPError(400, f"Missing field {error}")
+        except (TypeError, ValueError) as error:
+            raise HTTPError(400, f"Invalid request: {error}")
+
+    async def handle(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        """Serves the requests of one connection until it is closed"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                length = int(headers.get('content-length', 0))
+                try:
+                    if length > MAX_BODY:
+                        raise HTTPError(413, f"Bodies are limited to {MAX_BODY} bytes")
+                    body = await reader.readexactly(length)
+                    status, payload = await self.route(method, target.split('?')[0], body)
+                except HTTPError as error:
+                    status, payload = error.status, {'error':str(error)}
+                    keep_alive = keep_alive and error.status != 413
+                except Exception as error:
+                    status, payload = 500, {'error':repr(error)}
+                if isinstance(payload, bytes):
+                    await send_ndjson(writer, status, payload, keep_alive)
+                else:
+                    await send_json(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host:str='127.0.0.1', port:int=8765, ready=None):
+        """Runs the service until cancelled; ready, if given, is an event set once the socket listens"""
+        with ProcessPoolExecutor(max_workers=self.workers) as self.executor:
+            server = await asyncio.start_server(self.handle, host, port)
+            async with server:
+                print(f"Serving on http://{host}:{port} with {self.workers} workers", file=sys.stderr)
+                if ready is not None:
+                    ready.set()
+                await server.serve_forever()
+
+
+def canonical(body)->str:
+    """The request as a string that does not depend on the order of the keys, to find identical requests"""
+    return json.dumps(body, sort_keys=True, separators=(',', ':'))
+
+
+def _head(status:int, keep_alive:bool, content_type:str, **fields)->bytes:
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    lines += [f"{name.replace('_', '-').title()}: {value}" for name, value in fields.items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def send_json(writer:asyncio.StreamWriter, status:int, payload, keep_alive:bool=True):
+    body = json.dumps(payload).encode('utf-8')
+    writer.write(_head(status, keep_alive, 'application/json', content_length=len(body)) + body)
+    await writer.drain()
+
+
+async def send_ndjson(writer:asyncio.StreamWriter, status:int, lines:bytes, keep_alive:bool=True):
+    """Sends the computed lines with the chunked transfer encoding, waiting for the client to keep up between chunks"""
+    writer.write(_head(status, keep_alive, 'application/x-ndjson', transfer_encoding='chunked'))
+    view = memoryview(lines)
+    for start in range(0, len(lines), STREAM_CHUNK):
+        chunk = view[start:start + STREAM_CHUNK]
+        writer.write(f"{len(chunk):x}\r\n".encode('latin-1') + chunk + b'\r\n')
+        await writer.drain()
+    writer.write(b'0\r\n\r\n')
+    await writer.drain()
+
+
+def main(argv:list=None):
+    parser = argparse.ArgumentParser(description="Serves the mortgage calculator engine as a local HTTP/JSON API")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on (default: local only)")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument('--cache-mb', type=int, default=64, help="megabytes of requests and results kept in the shared cache")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="loans of a batch amortized together by a worker")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(MortgageService(args.workers, args.cache_mb*1024*1024, args.chunk_size).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
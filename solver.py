@@ -0,0 +1,78 @@
+## This file contains the solver that finds the smallest overpayment meeting a goal
+
+import math
+
+from conventions import PaymentConvention, MONTHLY
+from engine import summarise
+from schedules import RecurringRepayments
+
+KINDS = ('monthly', 'lump_sum')
+
+
+def overpayment_plan(monthly_payment:float, total_instalments:int, overpayment:float, kind:str='monthly', month:int=1)->tuple:
+    """The (repayments_oop, repayments_mop) schedules of a constant overpayment every instalment from a month on, or of a lump sum paid in a month"""
+    if kind == 'lump_sum':
+        return {month:overpayment}, RecurringRepayments()
+    return {}, RecurringRepayments([month], [total_instalments], [monthly_payment + overpayment])
+
+
+def solve_overpayment(mortgage_amount:int, interest_rate:float, mortgage_period:int, target_month:int=None, max_interest:float=None, kind:str='monthly', month:int=1, convention:PaymentConvention=MONTHLY)->dict:
+    """
+    Finds the smallest overpayment, to the penny, that pays the mortgage off by
+    target_month and/or keeps the total interest within max_interest.
+
+    The goals only get easier as the overpayment grows, so the answer is found
+    by bisection, each step being a closed-form summarise() of the plan.
+
+    Parameters
+    ----------
+    target_month : int, optional
+        Last instalment allowed.
+    max_interest : float, optional
+        Largest total interest allowed.
+    kind : str
+        'monthly' for a constant extra amount every instalment from month on,
+        'lump_sum' for a single payment in month.
+    month : int
+        First month of the monthly overpayments, or month of the lump sum.
+    convention : PaymentConvention
+        Payment frequency and interest accrual; with another convention than
+        MONTHLY, target_month and month are counted in instalments.
+
+    Returns
+    -------
+    dict
+        overpayment, instalments, total_paid and total_interest of the plan
+        found, or None if no overpayment can meet the goals.
+
+    """
+    if target_month is None and max_interest is None:
+        raise ValueError("Set a target_month, a max_interest or both")
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind of overpayment '{kind}', use one of {', '.join(KINDS)}")
+    total_instalments = convention.instalments(mortgage_period)
+    monthly_payment = convention.payment(mortgage_amount,interest_rate,mortgage_period)
+
+    def outcome(overpayment):
+        repayments_oop, repayments_mop = overpayment_plan(monthly_payment, total_instalments, overpayment, kind, month)
+        return summarise(mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, repayments_mop, convention)
+
+    def meets(result):
+        instalment, _, interest = result
+        return (target_month is None or instalment <= target_month) and (max_interest is None or interest <= max_interest)
+
+    # bisection in pennies, paying the whole amount borrowed on top being the most any plan can do
+    low, high = 0, math.ceil(mortgage_amount*100)
+    if meets(outcome(0.0)):
+        high = 0
+    elif not meets(outcome(high/100)):
+        return None
+    while high - low > 1:
+        middle = (low + high)//2
+        if meets(outcome(middle/100)):
+            high = middle
+        else:
+            low = middle
+    overpayment = high/100
+    instalment, payment_to_date, interest = outcome(overpayment)
+    return {'overpayment':overpayment, 'instalments':instalment, 'total_paid':payment_to_date, 'total_interest':interest}
@@ -0,0 +1,74 @@
+## This file contains the scenario sweep over interest rates, terms and overpayment levels
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from engine import batch_payments, calculate_batch
+from schedules import RecurringRepayments
+
+
+def sweep_chunk(mortgage_amount:float, interest_rates:np.ndarray, mortgage_periods:np.ndarray, overpayments:np.ndarray)->dict:
+    """Worker: amortizes a chunk of grid cells, each one overpaying a constant amount every month"""
+    amounts = np.full(len(interest_rates), mortgage_amount, dtype=np.float64)
+    monthly_payment = batch_payments(amounts, interest_rates, mortgage_periods)
+    repayments_mop = [RecurringRepayments([1], [period*12], [payment + overpayment]) if overpayment > 0 else None
+                      for period, payment, overpayment in zip(mortgage_periods.tolist(), monthly_payment.tolist(), overpayments.tolist())]
+    return calculate_batch(amounts, interest_rates, mortgage_periods, repayments_mop=repayments_mop, chunk_size=len(amounts))
+
+
+def sweep(mortgage_amount:float, interest_rates, mortgage_periods, overpayments=(0,), workers:int=None, chunk_size:int=2048):
+    """
+    Evaluates every combination of interest rate, term and monthly overpayment.
+
+    The grid is cut into chunks of cells that are amortized together by the
+    batch engine; when there is more than one chunk they are spread over a
+    pool of processes.
+
+    Parameters
+    ----------
+    mortgage_amount : float
+        Amount borrowed.
+    interest_rates, mortgage_periods, overpayments : sequence
+        Values of each axis of the grid: rates in percentage, terms in years
+        and amounts paid on top of the monthly payment.
+    workers : int, optional
+        Number of processes (default: number of CPUs, 1 to stay in process).
+    chunk_size : int
+        Cells per chunk.
+
+    Returns
+    -------
+    DataFrame
+        One row per cell, with the instalments, totals, and the months and
+        interest saved with respect to the same rate and term without
+        overpayments.
+
+    """
+    import pandas as pd
+
+    rate_axis = np.asarray(interest_rates, dtype=np.float64)
+    period_axis = np.asarray(mortgage_periods, dtype=np.int64)
+    overpayment_axis = np.asarray(overpayments, dtype=np.float64)
+    rates, periods, overs = (axis.ravel() for axis in np.meshgrid(rate_axis, period_axis, overpayment_axis, indexing='ij'))
+
+    chunks = [(mortgage_amount, rates[start:start + chunk_size], periods[start:start + chunk_size], overs[start:start + chunk_size])
+              for start in range(0, len(overs), chunk_size)]
+    if len(chunks) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            results = list(executor.map(sweep_chunk, *zip(*chunks)))
+    else:
+        results = [sweep_chunk(*chunk) for chunk in chunks]
+
+    table = pd.DataFrame({'Interest rate':rates, 'Mortgage period':periods, 'Overpayment':overs})
+    for key in ('Monthly payment', 'Instalments', 'Total paid', 'Total interest'):
+        table[key] = np.concatenate([result[key] for result in results]) if results else []
+
+    # each rate and term without overpayments, which the savings are measured against
+    base_rates, base_periods = (axis.ravel() for axis in np.meshgrid(rate_axis, period_axis, indexing='ij'))
+    baseline = calculate_batch(np.full(len(base_rates), mortgage_amount, dtype=np.float64), base_rates, base_periods)
+    cell = np.arange(len(overs))//max(len(overpayment_axis), 1)
+    table['Months saved'] = baseline['Instalments'][cell] - table['Instalments'].to_numpy()
+    table['Interest saved'] = baseline['Total interest'][cell] - table['Total interest'].to_numpy()
+    return table
@@ -0,0 +1,48 @@
+## This file contains the tests of the web app pages, run headless with streamlit's AppTest
+
+import os
+
+import pytest
+
+AppTest = pytest.importorskip('streamlit.testing.v1').AppTest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Mortgage_Calculator.py')
+
+
+def app():
+    return AppTest.from_file(APP, default_timeout=60).run()
+
+
+def test_calculate_runs_without_errors():
+    page = app()
+    assert not page.exception
+    widget(page.button, "Calculate").click().run()
+    assert not page.exception
+    assert page.session_state['results'][:3] == (250000.0, 3.4, 30)
+    assert any("Monthly payments" in str(element.value) for element in page.get('html'))
+
+
+def widget(widgets, label):
+    return next(element for element in widgets if element.label == label)
+
+
+def solve(page, interest_rate, frequency="Monthly"):
+    widget(page.text_input, "Interest Rate (%)").set_value(interest_rate)
+    widget(page.selectbox, "Payment frequency").select(frequency)
+    widget(page.toggle, "Find the overpayment for a goal?").set_value(True).run()
+    widget(page.button, "Solve").click().run()
+    return page
+
+
+def test_solve_at_zero_rate():
+    page = solve(app(), "0")
+    assert not page.exception
+    assert any("Monthly overpayment needed" in str(element.value) for element in page.get('html'))
+
+
+def test_solve_uses_the_selected_frequency():
+    page = solve(app(), "3.4", "Weekly")
+    assert not page.exception
+    cards = " ".join(str(element.value) for element in page.get('html'))
+    assert "Weekly overpayment needed" in cards
+    assert "paid off in 240 instalments" in cards
@@ -0,0 +1,75 @@
+## This file contains the tests of the batch runner on small files of loans
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch_runner
+from engine import calculate_batch
+from schedules import RecurringRepayments
+
+LOANS = [(250000, 3.4, 30, '12:5000;24:5000', '1-24:1500'),
+         (100000, 0, 10, '', ''),
+         (437000.5, 6.1, 25, '', '13-60:3500'),
+         (60000, 2.2, 5, '7:1000', ''),
+         (180000, 4.75, 20, '', ''),
+         ]
+
+
+def expected_summaries():
+    amounts, rates, periods, one_off, recurring = zip(*LOANS)
+    return calculate_batch(np.array(amounts, dtype=float), np.array(rates, dtype=float), np.array(periods),
+                           [batch_runner.parse_one_off(value) for value in one_off], [batch_runner.parse_recurring(value) for value in recurring])
+
+
+def check_summaries(table, loan_ids):
+    expected = expected_summaries()
+    assert table['Loan'].tolist() == loan_ids
+    for column, values in expected.items():
+        assert np.allclose(table[column].to_numpy(dtype=float), values, rtol=0, atol=1e-6), column
+
+
+def test_csv_loans_are_numbered_across_chunks(tmp_path):
+    source = tmp_path/'loans.csv'
+    pd.DataFrame(LOANS, columns=['mortgage_amount', 'interest_rate', 'mortgage_period', 'one_off', 'recurring']).to_csv(source, index=False)
+    stats = batch_runner.run(str(source), str(tmp_path/'summaries.csv'), workers=2, chunk_size=2)
+    assert (stats['loans'], stats['rows']) == (len(LOANS), len(LOANS))
+    check_summaries(pd.read_csv(tmp_path/'summaries.csv'), list(range(len(LOANS))))
+
+
+def test_jsonl_loans_keep_their_ids(tmp_path):
+    source = tmp_path/'loans.jsonl'
+    with open(source, 'w') as f:
+        for position, (amount, rate, period, one_off, recurring) in enumerate(LOANS):
+            f.write(json.dumps({'id':f'loan-{position}', 'mortgage_amount':amount, 'interest_rate':rate, 'mortgage_period':period,
+                                'one_off':one_off, 'recurring':recurring}) + '\n')
+    batch_runner.run(str(source), str(tmp_path/'summaries.jsonl'), workers=1, chunk_size=3)
+    table = pd.read_json(tmp_path/'summaries.jsonl', lines=True)
+    check_summaries(table, [f'loan-{position}' for position in range(len(LOANS))])
+
+
+def test_full_schedules_have_one_row_per_instalment(tmp_path):
+    source = tmp_path/'loans.csv'
+    pd.DataFrame(LOANS, columns=['mortgage_amount', 'interest_rate', 'mortgage_period', 'one_off', 'recurring']).to_csv(source, index=False)
+    stats = batch_runner.run(str(source), str(tmp_path/'schedules.parquet'), full_schedules=True, workers=1, chunk_size=2)
+    table = pd.read_parquet(tmp_path/'schedules.parquet')
+    instalments = expected_summaries()['Instalments']
+    assert stats['rows'] == len(table) == instalments.sum()
+    assert table.groupby('Loan')['Instalment'].max().tolist() == instalments.tolist()
+
+
+def test_recurring_periods_are_parsed():
+    assert batch_runner.parse_one_off('12:5000; 24:100') == {12:5000.0, 24:100.0}
+    assert batch_runner.parse_recurring('1-24:1500;25-36:1600').intervals() == RecurringRepayments([1, 25], [24, 36], [1500.0, 1600.0]).intervals()
+    assert batch_runner.parse_recurring('') is None
+
+
+def test_unsupported_output_is_a_usage_error(tmp_path, capsys):
+    with pytest.raises(SystemExit) as exit:
+        batch_runner.main([str(tmp_path/'loans.csv'), str(tmp_path/'out.xlsx')])
+    assert exit.value.code == 2
+    assert "unsupported output format 'xlsx', use one of csv, jsonl, parquet" in capsys.readouterr().err
+    with pytest.raises(ValueError):
+        batch_runner.run(str(tmp_path/'loans.csv'), str(tmp_path/'out.xlsx'))
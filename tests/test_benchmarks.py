@@ -0,0 +1,19 @@
+## This file contains the tests of the benchmark suite
+
+import benchmarks
+
+
+def test_filter_is_applied_before_building_inputs(monkeypatch):
+    def unexpected(*args, **kwargs):
+        raise AssertionError("the inputs of a benchmark that was not selected were built")
+    monkeypatch.setattr(benchmarks, 'random_book', unexpected)
+    monkeypatch.setattr(benchmarks, 'measure', lambda function, repeat: {'min':0.0, 'result':function()})
+    results = benchmarks.run('^payments/5y$', verbose=False)['results']
+    assert list(results) == ['payments/5y']
+    assert results['payments/5y']['result'] == benchmarks.payments(250000, 3.4, 5)
+
+
+def test_compare_flags_regressions():
+    baseline = {'results':{'a':{'min':1.0}, 'b':{'min':1.0}, 'c':{'min':1.0}}}
+    current = {'results':{'a':{'min':1.5}, 'b':{'min':0.5}, 'd':{'min':1.0}}}
+    assert [row[4] for row in benchmarks.compare(baseline, current)] == ['regression', 'faster', 'missing', 'new']
@@ -0,0 +1,86 @@
+## This file contains the tests of the schedule cache resuming from checkpoints
+
+import random
+
+import numpy as np
+import pytest
+
+from cache import ScheduleCache
+from engine import COLUMNS, amortize
+from schedules import RecurringRepayments
+
+
+def assert_same_schedule(result, expected):
+    schedule, instalment, payment_to_date = result
+    expected_schedule, expected_instalment, expected_paid = expected
+    assert instalment == expected_instalment
+    assert payment_to_date == pytest.approx(expected_paid, abs=1e-6)
+    for column in COLUMNS:
+        assert len(schedule[column]) == len(expected_schedule[column]), column
+        if expected_schedule[column].dtype == bool:
+            assert np.array_equal(schedule[column], expected_schedule[column]), column
+        else:
+            assert np.allclose(schedule[column], expected_schedule[column], rtol=0, atol=1e-6), column
+
+
+def test_change_from_month_zero_is_not_resumed():
+    cache = ScheduleCache()
+    cache.amortize(250000, 3.4, 30, 360)
+    repayments_mop = RecurringRepayments([0], [24], [3000.0])
+    result = cache.amortize(250000, 3.4, 30, 360, {}, repayments_mop)
+    assert_same_schedule(result, amortize(250000, 3.4, 30, 360, {}, repayments_mop))
+    assert result[1] == 265
+
+
+def test_identical_plan_is_a_hit():
+    cache = ScheduleCache()
+    first = cache.amortize(250000, 3.4, 30, 360, {12:5000.0})
+    assert cache.amortize(250000, 3.4, 30, 360, {12:5000.0}) is first
+    assert cache.stats()['hits'] == 1
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_resumed_schedules_match_fresh_amortize(seed):
+    rng = random.Random(seed)
+    mortgage_amount, interest_rate, mortgage_period = rng.choice([100000, 250000, 600000]), round(rng.uniform(0.5, 8), 2), rng.randint(5, 35)
+    total_instalments = mortgage_period*12
+    cache = ScheduleCache(checkpoint_every=rng.choice([1, 6, 12]))
+    for _ in range(6):
+        repayments_oop = {rng.randint(0, total_instalments):rng.choice([1000.0, 10000.0]) for _ in range(rng.randint(0, 3))}
+        start = rng.randint(0, total_instalments)
+        repayments_mop = RecurringRepayments([start], [start + rng.randint(0, 48)], [rng.choice([1500.0, 3000.0])]) if rng.random() < 0.7 else RecurringRepayments()
+        result = cache.amortize(mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, repayments_mop)
+        assert_same_schedule(result, amortize(mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, repayments_mop))
+
+
+def test_conventions_do_not_share_entries():
+    from conventions import payment_convention
+    cache = ScheduleCache()
+    for frequency, accrual in (('monthly', 'periodic'), ('monthly', 'daily'), ('weekly', 'periodic'), ('weekly', 'daily_compound')):
+        convention = payment_convention(frequency, accrual)
+        total_instalments = convention.instalments(25)
+        result = cache.amortize(250000, 3.4, 25, total_instalments, {40:5000.0}, convention=convention)
+        assert_same_schedule(result, amortize(250000, 3.4, 25, total_instalments, {40:5000.0}, convention=convention))
+    assert cache.stats()['hits'] == 0
+
+
+def test_cache_is_bounded_by_bytes():
+    from conventions import payment_convention
+    daily = payment_convention('daily', 'daily')
+    sizes = {rate:sum(values.nbytes for values in amortize(250000, rate, 50, daily.instalments(50), convention=daily)[0].values()) for rate in (3.4, 3.5, 3.6)}
+    cache = ScheduleCache(max_bytes=int(2.5*sizes[3.4]))
+    for rate in sizes:
+        cache.amortize(250000, rate, 50, daily.instalments(50), convention=daily)
+    stats = cache.stats()
+    assert (stats['size'], stats['bytes']) == (2, sizes[3.5] + sizes[3.6])
+    cache.amortize(250000, 3.5, 50, daily.instalments(50), convention=daily)
+    assert cache.stats()['hits'] == 1
+    cache.amortize(250000, 3.4, 50, daily.instalments(50), convention=daily)
+    assert cache.stats()['misses'] == 4
+    assert cache.stats()['bytes'] == sizes[3.5] + sizes[3.4]
+
+    small = ScheduleCache(max_bytes=sizes[3.4] - 1)
+    assert small.amortize(250000, 3.4, 50, daily.instalments(50), convention=daily)[1] == daily.instalments(50)
+    assert small.stats()['size'] == small.stats()['bytes'] == 0
+    cache.clear()
+    assert cache.stats()['bytes'] == 0
@@ -0,0 +1,120 @@
+## This file contains the tests of the payment frequencies and interest accruals against a plain per-period loop
+
+import numpy as np
+import pytest
+
+from conventions import ACCRUALS, FREQUENCIES, MONTHLY, payment_convention
+from engine import COLUMNS, amortize, summarise, yearly_frame
+from miscellaneous import payments
+from schedules import RecurringRepayments
+
+CONVENTIONS = [payment_convention(frequency, accrual) for frequency in FREQUENCIES for accrual in ACCRUALS]
+
+
+def period_loop(mortgage_amount, interest_rate, mortgage_period, convention, repayments_oop={}, repayments_mop={}):
+    """The original row-by-row loop, with the rate of one instalment period of the convention"""
+    rate = convention.rate(interest_rate)
+    payment = convention.payment(mortgage_amount, interest_rate, mortgage_period)
+    rows = []
+    remaining_principal, payment_to_date, interest_to_date, principal_to_date = mortgage_amount, 0, 0, 0
+    for instalment in range(1, convention.instalments(mortgage_period) + 1):
+        this_payment = repayments_mop.get(instalment, payment) + repayments_oop.get(instalment, 0)
+        interest = remaining_principal*rate
+        to_break = remaining_principal <= this_payment
+        if to_break:
+            this_payment = remaining_principal + interest
+        payment_to_date += this_payment
+        interest_to_date += interest
+        principal_to_date += this_payment - interest
+        rows.append((remaining_principal, this_payment, payment_to_date, interest, interest_to_date, this_payment - interest, principal_to_date,
+                     remaining_principal - (this_payment - interest), instalment in repayments_oop, instalment in repayments_mop))
+        remaining_principal -= this_payment - interest
+        if to_break:
+            break
+    return {column:np.array(values) for column, values in zip(COLUMNS, zip(*rows))}, len(rows), payment_to_date
+
+
+def plans(convention, mortgage_period):
+    """A one-off payment every 5 years and a higher payment over the second year, in instalments of the convention"""
+    per_year = convention.periods_per_year
+    payment = convention.payment(250000, 3.4, mortgage_period)
+    repayments_oop = {year*per_year:10000.0 for year in range(5, mortgage_period, 5)}
+    return repayments_oop, RecurringRepayments([per_year + 1], [2*per_year], [payment*1.5])
+
+
+@pytest.mark.parametrize('convention', CONVENTIONS, ids=lambda convention: f"{convention.frequency}-{convention.accrual}")
+@pytest.mark.parametrize('interest_rate', [0, 3.4, 7.25])
+@pytest.mark.parametrize('with_plans', [False, True])
+def test_amortize_and_summarise_match_the_period_loop(convention, interest_rate, with_plans):
+    mortgage_period = 20
+    repayments_oop, repayments_mop = plans(convention, mortgage_period) if with_plans else ({}, RecurringRepayments())
+    expected, expected_instalment, expected_paid = period_loop(250000, interest_rate, mortgage_period, convention, repayments_oop, dict(repayments_mop.items()))
+    total_instalments = convention.instalments(mortgage_period)
+
+    schedule, instalment, payment_to_date = amortize(250000, interest_rate, mortgage_period, total_instalments, repayments_oop, repayments_mop, convention=convention)
+    assert instalment == expected_instalment
+    assert payment_to_date == pytest.approx(expected_paid, abs=1e-6)
+    for column in COLUMNS:
+        if expected[column].dtype == bool:
+            assert np.array_equal(schedule[column][:instalment], expected[column]), column
+        else:
+            assert np.allclose(schedule[column][:instalment], expected[column], rtol=0, atol=1e-6), column
+
+    summary = summarise(250000, interest_rate, mortgage_period, total_instalments, repayments_oop, repayments_mop, convention)
+    assert summary == pytest.approx((expected_instalment, expected_paid, expected[COLUMNS[4]][-1]), abs=1e-6)
+
+
+def test_periodic_monthly_is_the_original_convention():
+    assert payment_convention() == MONTHLY
+    assert MONTHLY.instalments(30) == 360
+    assert MONTHLY.rate(3.4) == pytest.approx(0.034/12)
+    assert MONTHLY.payment(250000, 3.4, 30) == payments(250000, 3.4, 30)
+
+
+def test_daily_accrual_charges_more_with_compounding():
+    rates = [payment_convention('monthly', accrual).rate(5) for accrual in ACCRUALS]
+    assert rates[0] == pytest.approx(0.05/12)
+    assert rates[1] == pytest.approx(0.05*365/12/365)
+    assert rates[2] > rates[1]
+    assert payment_convention('daily', 'daily_compound').rate(5) == pytest.approx(0.05/365)
+
+
+def test_unknown_names_are_rejected():
+    with pytest.raises(ValueError, match="Unknown payment frequency 'yearly'"):
+        payment_convention('yearly')
+    with pytest.raises(ValueError, match="Unknown interest accrual 'hourly'"):
+        payment_convention('monthly', 'hourly')
+
+
+@pytest.mark.parametrize('frequency', list(FREQUENCIES))
+def test_yearly_frame_on_a_partial_final_year(frequency):
+    convention = payment_convention(frequency, 'daily')
+    per_year = convention.periods_per_year
+    repayments_oop = {2*per_year + 3:150000.0}
+    schedule, instalment, _ = amortize(250000, 3.4, 30, convention.instalments(30), repayments_oop, convention=convention)
+    assert instalment % per_year != 0
+    table = yearly_frame(schedule, instalment, COLUMNS, per_year)
+
+    years = -(-instalment//per_year)
+    assert list(table.index) == list(range(1, years + 1))
+    for year in range(years):
+        rows = slice(year*per_year, min((year + 1)*per_year, instalment))
+        assert table[COLUMNS[0]].iloc[year] == schedule[COLUMNS[0]][rows.start]
+        for column in (COLUMNS[1], COLUMNS[3], COLUMNS[5]):
+            assert table[column].iloc[year] == pytest.approx(schedule[column][rows].sum(), abs=1e-6)
+        for column in (COLUMNS[2], COLUMNS[4], COLUMNS[6], COLUMNS[7]):
+            assert table[column].iloc[year] == schedule[column][rows.stop - 1]
+        assert table[COLUMNS[8]].iloc[year] == schedule[COLUMNS[8]][rows].any()
+    assert table[COLUMNS[7]].iloc[-1] == pytest.approx(0, abs=1e-6)
+    assert table[COLUMNS[1]].sum() == pytest.approx(schedule[COLUMNS[2]][instalment - 1], abs=1e-6)
+
+
+def test_time_saved():
+    pytest.importorskip('streamlit')
+    from Mortgage_Calculator import time_saved
+    assert time_saved(18) == "1 year(s) and 6 months"
+    assert time_saved(30) == "2 year(s) and 6 months"
+    assert time_saved(12) == "1 year(s) and 0 months"
+    assert time_saved(0) == "0 year(s) and 0 months"
+    assert time_saved(78, payment_convention('weekly')) == "1.5 year(s), 78 weekly instalments,"
+    assert time_saved(365, payment_convention('daily', 'daily')) == "1.0 year(s), 365 daily instalments,"
@@ -0,0 +1,59 @@
+## This file contains the tests of the timing and memory instrumentation
+
+import tracemalloc
+
+from diagnostics import Diagnostics, diagnostics_enabled, memory_tracing_enabled
+
+
+def test_query_parameter_only_gives_timings():
+    assert diagnostics_enabled({}, {'diagnostics':'1'})
+    assert not memory_tracing_enabled({})
+    assert memory_tracing_enabled({'MORTGAGE_DIAGNOSTICS':'on'})
+
+
+def test_timings_only_do_not_trace_memory():
+    with Diagnostics(True) as diagnostics:
+        with diagnostics.stage('outer'):
+            with diagnostics.stage('inner', rows=3):
+                pass
+    assert not tracemalloc.is_tracing()
+    assert [(record['stage'], record['depth'], record['peak_bytes']) for record in diagnostics.stages] == [('inner', 1, None), ('outer', 0, None)]
+    assert diagnostics.total() >= 0
+
+
+def test_memory_tracing_stops_with_the_run_that_started_it():
+    with Diagnostics(True, memory=True) as diagnostics:
+        assert tracemalloc.is_tracing()
+        with diagnostics.stage('outer'):
+            with diagnostics.stage('inner'):
+                data = bytearray(1 << 20)
+            del data
+    assert not tracemalloc.is_tracing()
+    inner, outer = diagnostics.stages
+    assert inner['peak_bytes'] >= 1 << 20
+    assert outer['peak_bytes'] >= inner['peak_bytes']
+
+
+def test_only_one_run_traces_memory_at_a_time():
+    first = Diagnostics(True, memory=True)
+    second = Diagnostics(True, memory=True)
+    assert first.memory and not second.memory
+    with second.stage('timed'):
+        pass
+    assert second.stages[0]['peak_bytes'] is None
+    second.close()
+    assert tracemalloc.is_tracing()
+    first.close()
+    assert not tracemalloc.is_tracing()
+    third = Diagnostics(True, memory=True)
+    assert third.memory
+    third.close()
+
+
+def test_tracing_started_elsewhere_is_left_running():
+    tracemalloc.start()
+    try:
+        Diagnostics(True, memory=True).close()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,110 @@
+## This file contains the regression tests of the amortization engine against the original row-by-row loop
+
+import random
+
+import numpy as np
+import pytest
+
+from engine import COLUMNS, amortize, summarise
+from miscellaneous import payments, current_interest_paid, clean
+from schedules import RecurringRepayments
+
+# the closed form and the month-by-month recurrence round differently in the last bits, so a value
+# lying on a half cent can be formatted one cent apart; the unrounded values must agree within this
+TOLERANCE = 1e-6
+
+
+def legacy_calculate(mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop={}, repayments_mop={}):
+    """The loop of the original calculate(), without the formatting: one list of values per column"""
+    monthly_payment = payments(mortgage_amount,interest_rate,mortgage_period)
+    rows = []
+    remaining_principal = mortgage_amount
+    payment_to_date = 0
+    interest_paid_to_date = 0
+    principal_repaid_to_date = 0
+    for instalment in range(1, total_instalments+1):
+        this_month_payment = monthly_payment
+        increased_payment = instalment in repayments_mop
+        if increased_payment:
+            this_month_payment = repayments_mop[instalment]
+        one_off_repayment = instalment in repayments_oop
+        if one_off_repayment:
+            this_month_payment += repayments_oop[instalment]
+        principal_to_date = remaining_principal
+        curr_interest_paid = current_interest_paid(principal_to_date, interest_rate)
+        to_break = principal_to_date <= this_month_payment
+        if to_break:
+            this_month_payment = principal_to_date + curr_interest_paid
+        payment_to_date += this_month_payment
+        interest_paid_to_date += curr_interest_paid
+        principal_repaid = this_month_payment - curr_interest_paid
+        principal_repaid_to_date += principal_repaid
+        remaining_principal -= principal_repaid
+        rows.append((principal_to_date, this_month_payment, payment_to_date, curr_interest_paid, interest_paid_to_date,
+                     principal_repaid, principal_repaid_to_date, remaining_principal, one_off_repayment, increased_payment))
+        if to_break:
+            break
+    return {column:np.array(values) for column, values in zip(COLUMNS, zip(*rows))}, len(rows), payment_to_date
+
+
+def random_loans(count, seed):
+    rng = random.Random(seed)
+    for _ in range(count):
+        mortgage_amount = rng.choice([50000, 250000, 437000.5, 1000000])
+        interest_rate = round(rng.uniform(0.5, 9), 2)
+        mortgage_period = rng.randint(5, 40)
+        total_instalments = mortgage_period*12
+        repayments_oop = {rng.randint(1, total_instalments):rng.choice([1000.0, 5000.0, 20000.0]) for _ in range(rng.randint(0, 4))}
+        periods = []
+        if rng.random() < 0.6:
+            start = rng.randint(1, total_instalments//2)
+            periods.append({"start":start, "end":start + rng.randint(0, 60), "amount_paid":payments(mortgage_amount, interest_rate, mortgage_period) + rng.choice([100.0, 500.0, 2000.0])})
+        yield mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, periods
+
+
+@pytest.mark.parametrize('loan', list(random_loans(200, seed=1)))
+def test_amortize_matches_legacy_loop(loan):
+    mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, periods = loan
+    legacy_mop = {month:period["amount_paid"] for period in periods for month in range(period["start"], period["end"]+1)}
+    expected, expected_instalment, expected_paid = legacy_calculate(mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, legacy_mop)
+
+    schedule, instalment, payment_to_date = amortize(mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, RecurringRepayments.from_periods(periods))
+    assert instalment == expected_instalment
+    assert payment_to_date == pytest.approx(expected_paid, abs=TOLERANCE)
+    for column in COLUMNS:
+        if expected[column].dtype == bool:
+            assert np.array_equal(schedule[column], expected[column]), column
+        else:
+            assert np.allclose(schedule[column], expected[column], rtol=0, atol=TOLERANCE), column
+
+    assert summarise(mortgage_amount, interest_rate, mortgage_period, total_instalments, repayments_oop, RecurringRepayments.from_periods(periods)) == pytest.approx(
+        (expected_instalment, expected_paid, expected[COLUMNS[4]][-1]), abs=TOLERANCE)
+
+
+def test_formatted_cells_within_one_cent():
+    schedule, instalment, _ = amortize(250000, 1.2, 5, 60)
+    expected, _, _ = legacy_calculate(250000, 1.2, 5, 60)
+    for column in COLUMNS[:8]:
+        cents = np.array([float(clean(value).replace(',', '')) for value in schedule[column]]) - np.array([float(clean(value).replace(',', '')) for value in expected[column]])
+        assert np.all(np.abs(cents) <= 0.01 + 1e-9), column
+
+
+def test_batch_matches_single_loans_including_zero_rate():
+    import warnings
+    from engine import calculate_batch
+
+    loans = [(250000, 3.4, 30), (100000, 0.0, 10), (437000.5, 6.1, 25), (60000, 0, 5)]
+    amounts, rates, periods = (np.array(values) for values in zip(*loans))
+    repayments_oop = [{12:5000.0}, {}, None, {7:1000.0}]
+    repayments_mop = [None, RecurringRepayments([1], [24], [1200.0]), None, None]
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        result = calculate_batch(amounts.astype(float), rates.astype(float), periods, repayments_oop, repayments_mop)
+    for loan, (mortgage_amount, interest_rate, mortgage_period) in enumerate(loans):
+        instalment, payment_to_date, interest = summarise(mortgage_amount, interest_rate, mortgage_period, mortgage_period*12, repayments_oop[loan] or {}, repayments_mop[loan] or {})
+        assert np.isfinite(result['Monthly payment'][loan])
+        assert result['Instalments'][loan] == instalment
+        assert result['Total paid'][loan] == pytest.approx(payment_to_date, abs=TOLERANCE)
+        assert result['Total interest'][loan] == pytest.approx(interest, abs=TOLERANCE)
+    assert result['Monthly payment'][1] == 833.33
+    assert result['Total interest'][1] == 0
@@ -0,0 +1,108 @@
+## This file contains the round-trip tests of the CSV, JSON lines, Parquet and Excel exports
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine import COLUMNS, amortize, calculate_batch, schedule_columns
+from export import BLOCK_SIZE, batch_blocks, plan_block, schedule_blocks, write_csv, write_jsonl, write_parquet, write_workbook
+from schedules import RecurringRepayments
+
+REPAYMENTS_OOP = {12:5000.0, 100:20000.0}
+REPAYMENTS_MOP = RecurringRepayments([1, 200], [24, 230], [1500.0, 1700.0])
+
+
+def loan():
+    schedule, instalment, payment_to_date = amortize(250000, 3.4, 50, 600, REPAYMENTS_OOP, REPAYMENTS_MOP)
+    return schedule, instalment, payment_to_date, schedule_columns(REPAYMENTS_OOP, REPAYMENTS_MOP)
+
+
+def check_schedule(table, schedule, instalment, columns):
+    assert list(table.columns) == ['Instalment'] + columns
+    assert len(table) == instalment
+    assert table['Instalment'].tolist() == list(range(1, instalment + 1))
+    for column in columns:
+        if schedule[column].dtype == bool:
+            assert table[column].dtype == bool, column
+            assert np.array_equal(table[column].to_numpy(), schedule[column][:instalment]), column
+        else:
+            assert np.allclose(table[column].to_numpy(dtype=float), schedule[column][:instalment], rtol=0, atol=1e-9), column
+
+
+def test_schedule_blocks_split_the_schedule():
+    schedule, instalment, _, columns = loan()
+    blocks = list(schedule_blocks(schedule, instalment, columns, block_size=100))
+    assert [len(block['Instalment']) for block in blocks] == [100]*(instalment//100) + ([instalment % 100] if instalment % 100 else [])
+    assert len(list(schedule_blocks(schedule, instalment, columns))) == -(-instalment//BLOCK_SIZE)
+
+
+@pytest.mark.parametrize('writer, reader', [(write_csv, pd.read_csv), (write_parquet, pd.read_parquet), (write_jsonl, lambda file: pd.read_json(file, lines=True))])
+def test_schedule_round_trips(writer, reader):
+    schedule, instalment, _, columns = loan()
+    assert {'One-off', 'Increased'} <= set(columns)
+    output = io.BytesIO()
+    writer(output, schedule_blocks(schedule, instalment, columns, block_size=64))
+    output.seek(0)
+    check_schedule(reader(output), schedule, instalment, columns)
+
+
+def test_empty_export_writes_nothing():
+    output = io.BytesIO()
+    write_csv(output, [])
+    write_parquet(output, [])
+    assert output.getvalue() == b''
+
+
+def test_workbook_round_trips():
+    openpyxl = pytest.importorskip('openpyxl')
+    schedule, instalment, payment_to_date, columns = loan()
+    summary = {'Instalments':instalment, 'Total paid':payment_to_date}
+    scenarios = [{'Overpayment':0.0, 'Instalments':600}, {'Overpayment':100.0, 'Instalments':500}]
+    output = io.BytesIO()
+    write_workbook(output, schedule, instalment, columns, summary, REPAYMENTS_OOP, REPAYMENTS_MOP, scenarios)
+    output.seek(0)
+    workbook = openpyxl.load_workbook(output, read_only=True)
+    assert workbook.sheetnames == ['Schedule', 'Summary', 'Overpayment plan', 'Scenarios']
+
+    rows = list(workbook['Schedule'].iter_rows(values_only=True))
+    check_schedule(pd.DataFrame(rows[1:], columns=rows[0]), schedule, instalment, columns)
+    rows = list(workbook['Summary'].iter_rows(values_only=True))
+    assert rows == [('Item', 'Value'), ('Instalments', instalment), ('Total paid', pytest.approx(payment_to_date))]
+    rows = list(workbook['Overpayment plan'].iter_rows(values_only=True))
+    plan = plan_block(REPAYMENTS_OOP, REPAYMENTS_MOP)
+    assert rows == [tuple(plan)] + list(zip(*plan.values()))
+    assert len(list(workbook['Scenarios'].iter_rows(values_only=True))) == 1 + len(scenarios)
+
+
+def test_workbook_without_scenarios():
+    openpyxl = pytest.importorskip('openpyxl')
+    schedule, instalment, payment_to_date = amortize(100000, 2.0, 5, 60)
+    output = io.BytesIO()
+    write_workbook(output, schedule, instalment, COLUMNS[:8], {'Instalments':instalment})
+    output.seek(0)
+    workbook = openpyxl.load_workbook(output, read_only=True)
+    assert workbook.sheetnames == ['Schedule', 'Summary', 'Overpayment plan']
+    assert len(list(workbook['Schedule'].iter_rows(values_only=True))) == 1 + instalment
+    assert list(workbook['Overpayment plan'].iter_rows(values_only=True)) == [('Type', 'Start', 'End', 'Payment')]
+
+
+def test_batch_blocks_full_schedules_have_no_missing_rows():
+    amounts, rates, periods = np.array([250000.0, 100000.0, 60000.0]), np.array([3.4, 0.0, 6.0]), np.array([30, 10, 5])
+    repayments_oop, repayments_mop = [{12:50000.0}, None, None], [None, None, RecurringRepayments([1], [60], [2000.0])]
+    summaries = calculate_batch(amounts, rates, periods, repayments_oop, repayments_mop)
+    blocks = list(batch_blocks(amounts, rates, periods, repayments_oop, repayments_mop, full_schedules=True, chunk_size=2, loan_ids=['a', 'b', 'c']))
+    table = pd.concat([pd.DataFrame(block) for block in blocks], ignore_index=True)
+    assert list(table.columns) == ['Loan', 'Instalment'] + COLUMNS
+    assert not table.isna().any().any()
+    assert table.groupby('Loan', sort=False).size().tolist() == summaries['Instalments'].tolist()
+    assert table.groupby('Loan', sort=False)['Instalment'].max().tolist() == summaries['Instalments'].tolist()
+    assert np.allclose(table.groupby('Loan', sort=False)['Paid to date'].last(), summaries['Total paid'], rtol=0, atol=1e-6)
+    for column in COLUMNS[8:]:
+        assert table[column].dtype == bool
+
+
+def test_batch_blocks_summaries_are_numbered():
+    blocks = list(batch_blocks(np.full(5, 100000.0), np.full(5, 3.0), np.full(5, 10), chunk_size=2))
+    assert [block['Loan'].tolist() for block in blocks] == [[0, 1], [2, 3], [4]]
@@ -0,0 +1,43 @@
+## This file contains the tests of the Monte Carlo simulation of variable rate mortgages
+
+import numpy as np
+
+from montecarlo import PERCENTILES, _simulate_chunk, mean_reverting_paths, simulate, step_rate_path
+
+
+def exact_bands(monthly_payment, percentiles=PERCENTILES):
+    """The bands computed from every payment instead of the histogram"""
+    bands = np.full((len(percentiles), monthly_payment.shape[1]), np.nan)
+    for month in range(monthly_payment.shape[1]):
+        running = monthly_payment[~np.isnan(monthly_payment[:, month]), month]
+        if len(running):
+            bands[:, month] = np.percentile(running, percentiles, method='inverted_cdf')
+    return bands
+
+
+def test_low_rates_are_percentages():
+    rate = 0.2/100/12
+    growth = (1 + rate)**360
+    payment = round(250000*rate*growth/(growth - 1), 2)
+    result = simulate(250000, step_rate_path(0.2, 360))
+    assert abs(result['Monthly payment'][2, 0] - payment) <= payment/2000 + 1e-9
+
+
+def test_bands_follow_a_jump_past_the_histogram():
+    paths = np.array([step_rate_path(0.5, 360, {month:22.0}) for month in range(1, 400, 8)])
+    monthly_payment, _, _ = _simulate_chunk(250000, paths, 0.0)
+    expected = exact_bands(monthly_payment)
+    result = simulate(250000, paths, chunk_size=7)
+    width = np.nanmedian(monthly_payment[:, 0])/1000
+    assert np.nanmax(monthly_payment) > 5000*width
+    assert np.array_equal(np.isnan(result['Monthly payment']), np.isnan(expected))
+    assert np.nanmax(np.abs(result['Monthly payment'] - expected)) <= width/2 + 1e-9
+
+
+def test_bands_of_stochastic_paths_are_within_half_a_bin():
+    chunks = list(mean_reverting_paths(4.0, 300, 2000, long_term_rate=6.0, volatility=3.0, reset_every=12, chunk_size=500, seed=3))
+    monthly_payment = np.concatenate([_simulate_chunk(200000, chunk, 100.0)[0] for chunk in chunks])
+    result = simulate(200000, iter(chunks), overpayment=100.0)
+    width = np.nanmedian(monthly_payment[:, 0])/1000
+    assert result['Paths'] == 2000
+    assert np.nanmax(np.abs(result['Monthly payment'] - exact_bands(monthly_payment))) <= width/2 + 1e-9
@@ -0,0 +1,77 @@
+## This file contains the tests of the overpayment plan rows and of the bulk import
+
+import pandas as pd
+import pytest
+
+from export import plan_block
+from plans import PlanRows, ONE_OFF_COLUMNS, RECURRING_COLUMNS, MAX_ERRORS, parse_plan, one_off_repayments, recurring_repayments
+from schedules import RecurringRepayments
+
+
+def test_exported_plan_round_trips():
+    repayments_oop, repayments_mop = {12:5000.0, 30:250.5}, RecurringRepayments([1, 40], [24, 60], [1500.0, 1800.0])
+    one_off, recurring, errors = parse_plan(pd.DataFrame(plan_block(repayments_oop, repayments_mop)).to_csv(index=False))
+    assert errors == []
+    assert one_off == {'Payment':[5000.0, 250.5], 'Month':[12, 30]}
+    assert recurring == {'Payment':[1500.0, 1800.0], 'Start':[1, 40], 'End':[24, 60]}
+
+
+def test_type_is_case_insensitive():
+    one_off, recurring, errors = parse_plan("type,start,end,payment\n ONE-OFF ,3,,100\nrecurring,5,8,900\nRecurring,9,12,950\n")
+    assert errors == []
+    assert one_off['Month'] == [3]
+    assert recurring['Start'] == [5, 9]
+
+
+def test_unknown_types_are_row_errors():
+    one_off, recurring, errors = parse_plan("Type,Start,End,Payment\nOne-off,3,3,100\nrecurrent,5,8,900\n,9,9,50\nLump sum,10,10,50\n")
+    assert errors == ["ERROR: Row 2, the type must be One-off or Recurring",
+                      "ERROR: Row 3, the type must be One-off or Recurring",
+                      "ERROR: Row 4, the type must be One-off or Recurring"]
+    assert one_off == {'Payment':[], 'Month':[]} and recurring == {'Payment':[], 'Start':[], 'End':[]}
+
+
+def test_without_type_the_end_decides():
+    one_off, recurring, errors = parse_plan("Payment,Month,End\n100,3,\n900,5,8\n")
+    assert errors == []
+    assert one_off == {'Payment':[100.0], 'Month':[3]}
+    assert recurring == {'Payment':[900.0], 'Start':[5], 'End':[8]}
+
+
+@pytest.mark.parametrize('source, error', [
+    ("Payment,End\n100,3\n", "ERROR: Missing column(s) Start"),
+    ("Payment,Start\n-5,3\n", "ERROR: Row 1, the payment must be a positive amount"),
+    ("Payment,Start\n5,1.5\n", "ERROR: Row 1, the month must be a whole number from 1"),
+    ("Type,Payment,Start\nRecurring,5,2\n", "ERROR: Row 1, a recurring payment needs a whole End month"),
+    ("Payment,Start\n5,2\n6,2\n", "ERROR: Row 1, there is already a one-off payment on this month"),
+    ("Payment,Start,End\n5,2,10\n6,8,12\n", "ERROR: There is a clash between repayment periods. A new period starts (Month 8) before another ends (Month 10)"),
+    ("", None),
+])
+def test_invalid_plans_return_no_rows(source, error):
+    one_off, recurring, errors = parse_plan(source)
+    assert one_off == {'Payment':[], 'Month':[]} and recurring == {'Payment':[], 'Start':[], 'End':[]}
+    assert errors and (error is None or errors[0] == error)
+
+
+def test_errors_are_capped_per_rule():
+    _, _, errors = parse_plan("Payment,Start\n" + "".join(f"-1,{month}\n" for month in range(1, 30)))
+    assert len(errors) == MAX_ERRORS
+
+
+def test_rows_already_entered_are_checked():
+    one_off, recurring = PlanRows(ONE_OFF_COLUMNS), PlanRows(RECURRING_COLUMNS)
+    one_off.append(Payment=100.0, Month=3)
+    recurring.append(Payment=900.0, Start=10, End=20)
+    _, _, errors = parse_plan("Payment,Start,End\n50,3,\n", one_off, recurring)
+    assert errors == ["ERROR: Row 1, a one-off payment was already entered for this month"]
+    _, _, errors = parse_plan("Payment,Start,End\n50,15,30\n", one_off, recurring)
+    assert errors == ["ERROR: There is a clash between repayment periods. A new period starts (Month 15) before another ends (Month 20)"]
+
+
+def test_rows_to_repayments():
+    one_off, recurring = PlanRows(ONE_OFF_COLUMNS), PlanRows(RECURRING_COLUMNS)
+    one_off.extend(Payment=[100.0, float('nan'), 300.0], Month=[3, 4, 3])
+    recurring.extend(Payment=[900.0, 950.0], Start=[1, 13], End=[12, 24])
+    recurring.pop()
+    assert one_off_repayments(one_off) == {3:300.0}
+    assert recurring_repayments(recurring).intervals() == RecurringRepayments([1], [12], [900.0]).intervals()
@@ -0,0 +1,55 @@
+## This file contains the tests of the recurring repayments against the original pairwise check and dictionary expansion
+
+import random
+
+import numpy as np
+import pytest
+
+from miscellaneous import check_recurring_repayments
+from schedules import RecurringRepayments
+
+
+def legacy_check(periods):
+    """The loop of the original check_recurring_repayments(), returning the message it printed (None if the periods are fine)"""
+    periods = [period for period in sorted(periods, key=lambda item: item["start"])]
+    len_periods = len(periods)
+    for idx in range(len_periods):
+        if periods[idx]["start"] > periods[idx]["end"]:
+            return f"ERROR: For a time period set in repayments the end date (Month {periods[idx]['end']}) preceeds the start date (Month {periods[idx]['start']})"
+        if idx < len_periods-1:
+            if periods[idx+1]["start"] <= periods[idx]["end"]:
+                return f"ERROR: There is a clash between repayment periods. A new period starts (Month {periods[idx+1]['start']}) before another ends (Month {periods[idx]['end']})"
+    return None
+
+
+def random_periods(rng):
+    periods = []
+    for _ in range(rng.randint(0, 8)):
+        start = rng.randint(0, 120)
+        periods.append({"start":start, "end":start + rng.randint(-3, 24), "amount_paid":rng.choice([1000.0, 1500.0, 2000.0])})
+    return periods
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_validate_matches_pairwise_check(seed, capsys):
+    periods = random_periods(random.Random(seed))
+    expected = legacy_check(periods)
+    schedule = RecurringRepayments([period["start"] for period in periods], [period["end"] for period in periods], [period["amount_paid"] for period in periods])
+    assert schedule.validate() == expected
+    assert check_recurring_repayments(periods) == (expected is None)
+    assert capsys.readouterr().out.strip() == (expected or '')
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_lookup_matches_dictionary_expansion(seed):
+    periods = random_periods(random.Random(seed))
+    expanded = {month:period["amount_paid"] for period in periods for month in range(period["start"], period["end"]+1)}
+    months = np.arange(-1, 160)
+    expected = np.array([expanded.get(month, np.nan) for month in months.tolist()])
+    assert np.array_equal(RecurringRepayments.from_periods(periods).lookup(months), expected, equal_nan=True)
+
+
+def test_equal_starts_keep_entry_order():
+    periods = [{"start":5, "end":3, "amount_paid":1.0}, {"start":5, "end":9, "amount_paid":2.0}]
+    assert RecurringRepayments.from_periods(periods).validate() is None
+    assert RecurringRepayments([5, 5], [3, 9], [1.0, 2.0]).validate() == legacy_check(periods)
@@ -0,0 +1,147 @@
+## This file contains the tests of the HTTP/JSON service, its routes and its result cache
+
+import asyncio
+import json
+
+import pytest
+
+from engine import amortize, summarise
+from schedules import RecurringRepayments
+from service import MortgageService, ResultCache, HTTPError, quote
+
+LOAN = {'mortgage_amount':250000, 'interest_rate':3.4, 'mortgage_period':30, 'one_off':'12:10000', 'recurring':'1-24:1500'}
+
+
+def route(service, method, path, body=None):
+    """Answers one request in a fresh event loop, the workers being threads of the default executor"""
+    payload = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8') if body is not None else b''
+    return asyncio.run(service.route(method, path, payload))
+
+
+def error_of(service, method, path, body=None):
+    with pytest.raises(HTTPError) as error:
+        route(service, method, path, body)
+    return error.value.status, str(error.value)
+
+
+def test_quote_matches_the_engine():
+    status, payload = route(MortgageService(workers=1), 'POST', '/quote', LOAN)
+    instalment, payment_to_date, interest = summarise(250000, 3.4, 30, 360, {12:10000.0}, RecurringRepayments([1], [24], [1500.0]))
+    assert status == 200
+    assert payload == quote(LOAN)
+    assert (payload['instalments'], payload['total_paid'], payload['total_interest']) == (instalment, payment_to_date, interest)
+
+
+def test_schedule_has_one_line_per_instalment():
+    status, payload = route(MortgageService(workers=1), 'POST', '/schedule', LOAN)
+    _, instalment, _ = amortize(250000, 3.4, 30, 360, {12:10000.0}, RecurringRepayments([1], [24], [1500.0]))
+    lines = [json.loads(line) for line in payload.splitlines()]
+    assert status == 200
+    assert len(lines) == instalment
+
+
+def test_batch_numbers_the_loans_across_chunks():
+    loans = [dict(LOAN, mortgage_period=period) for period in (5, 10, 15, 20)] + [{'mortgage_amount':60000, 'interest_rate':0, 'mortgage_period':5}]
+    status, payload = route(MortgageService(workers=1, chunk_size=2), 'POST', '/batch', {'loans':loans})
+    lines = [json.loads(line) for line in payload.splitlines()]
+    assert status == 200
+    assert [line['Loan'] for line in lines] == [0, 1, 2, 3, 4]
+    assert [line['Instalments'] for line in lines] == [quote(loan)['instalments'] for loan in loans]
+    assert lines[4]['Monthly payment'] == 1000.0 and lines[4]['Total interest'] == 0
+
+
+@pytest.mark.parametrize('path, body, status, message', [
+    ('/quote', b'[1,2]', 400, "Expected a JSON object"),
+    ('/quote', b'{"mortgage_amount":', 400, "Invalid JSON"),
+    ('/quote', {'mortgage_amount':1000, 'interest_rate':3}, 400, "Missing field 'mortgage_period'"),
+    ('/quote', dict(LOAN, mortgage_period=0), 400, "mortgage_period must be at least 1 year"),
+    ('/schedule', dict(LOAN, mortgage_amount=-5), 400, "mortgage_amount must be a positive amount"),
+    ('/quote', dict(LOAN, interest_rate=-1), 400, "interest_rate must not be negative"),
+    ('/quote', dict(LOAN, frequency='yearly'), 400, "Unknown payment frequency 'yearly'"),
+    ('/batch', {'loans':{}}, 400, 'Expected {"loans":[...]}'),
+    ('/batch', {'loans':[LOAN, [1, 2]]}, 400, "Loan 1: A loan must be a JSON object"),
+    ('/batch', {'loans':[dict(LOAN, mortgage_period=0)]}, 400, "Loan 0: mortgage_period must be at least 1 year"),
+    ('/batch', {'loans':[LOAN, dict(LOAN, frequency='weekly')]}, 400, "Loan 1: /batch only amortizes monthly loans"),
+    ('/batch', {'loans':[dict(LOAN, accrual='daily')]}, 400, "Loan 0: /batch only amortizes monthly loans"),
+    ('/quote', dict(LOAN, one_off='12'), 400, "one_off could not be read (not enough values to unpack"),
+    ('/schedule', dict(LOAN, recurring=[{'start':1}]), 400, "recurring could not be read ('end')"),
+    ('/batch', {'loans':[LOAN, LOAN, dict(LOAN, one_off='12')]}, 400, "Loan 2: one_off could not be read (not enough values to unpack"),
+    ('/batch', {'loans':[dict(LOAN, recurring='1-x:100')]}, 400, "Loan 0: recurring could not be read (invalid literal"),
+    ('/batch', {'loans':[dict(LOAN, one_off=12)]}, 400, "Loan 0: one_off could not be read"),
+    ('/unknown', {}, 404, "Unknown endpoint /unknown"),
+])
+def test_invalid_requests_are_client_errors(path, body, status, message):
+    error_status, error = error_of(MortgageService(workers=1), 'POST', path, body)
+    assert error_status == status
+    assert message in error
+
+
+def test_get_is_not_allowed_on_the_engine():
+    assert error_of(MortgageService(workers=1), 'GET', '/quote')[0] == 405
+
+
+def test_cache_is_bounded_by_bytes():
+    async def scenario():
+        cache = ResultCache(max_bytes=100)
+
+        async def compute(result):
+            return result
+        first = await cache.get(('a', 'x'), lambda: compute(b'1'*40))
+        await asyncio.sleep(0)
+        await cache.get(('b', 'x'), lambda: compute(b'2'*40))
+        await asyncio.sleep(0)
+        await cache.get(('c', 'x'), lambda: compute(b'3'*40))
+        await asyncio.sleep(0)
+        await cache.get(('d', 'x'), lambda: compute(b'4'*200))
+        await asyncio.sleep(0)
+        assert first == b'1'*40
+        return cache.stats()
+    stats = asyncio.run(scenario())
+    assert stats['size'] == 2
+    assert stats['bytes'] == 2*42
+    assert stats['misses'] == 4
+
+
+def test_identical_requests_are_served_from_the_cache():
+    async def scenario(service):
+        body = json.dumps(LOAN).encode('utf-8')
+        answers = await asyncio.gather(*(service.route('POST', '/quote', body) for _ in range(3)))
+        await service.route('POST', '/quote', json.dumps(dict(reversed(list(LOAN.items())))).encode('utf-8'))
+        return answers, service.cache.stats()
+    answers, stats = asyncio.run(scenario(MortgageService(workers=1)))
+    assert all(answer == answers[0] for answer in answers)
+    assert (stats['misses'], stats['coalesced'], stats['hits']) == (1, 2, 1)
+
+
+def test_server_answers_over_keep_alive():
+    async def scenario():
+        service = MortgageService(workers=1)
+        server = await asyncio.start_server(service.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        answers = []
+        for path, body in (('/schedule', json.dumps(LOAN).encode('utf-8')), ('/quote', b'[1,2]'), ('/health', b'')):
+            writer.write(f"POST {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            headers = {}
+            while (line := await reader.readline()) != b'\r\n':
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            if headers.get('transfer-encoding') == 'chunked':
+                payload = b''
+                while (size := int(await reader.readline(), 16)):
+                    payload += await reader.readexactly(size)
+                    await reader.readline()
+                await reader.readline()
+            else:
+                payload = await reader.readexactly(int(headers['content-length']))
+            answers.append((status, payload))
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return answers
+    (schedule_status, schedule), (error_status, error), (health_status, health) = asyncio.run(scenario())
+    assert schedule_status == 200 and len(schedule.splitlines()) == quote(LOAN)['instalments']
+    assert error_status == 400 and json.loads(error) == {'error':"Expected a JSON object"}
+    assert health_status == 200 and json.loads(health) == {'status':'ok'}
@@ -0,0 +1,48 @@
+## This file contains the tests of the overpayment goal solver
+
+import pytest
+
+from conventions import MONTHLY, payment_convention
+from engine import summarise
+from solver import overpayment_plan, solve_overpayment
+
+
+def outcome(mortgage_amount, interest_rate, mortgage_period, overpayment, kind, month, convention=MONTHLY):
+    payment, total_instalments = convention.payment(mortgage_amount, interest_rate, mortgage_period), convention.instalments(mortgage_period)
+    return summarise(mortgage_amount, interest_rate, mortgage_period, total_instalments, *overpayment_plan(payment, total_instalments, overpayment, kind, month), convention)
+
+
+@pytest.mark.parametrize('interest_rate', [0, 0.0, 3.4])
+@pytest.mark.parametrize('kind, month', [('monthly', 1), ('monthly', 13), ('lump_sum', 12)])
+def test_smallest_overpayment_to_the_penny(interest_rate, kind, month):
+    solution = solve_overpayment(100000, interest_rate, 10, target_month=60, kind=kind, month=month)
+    assert solution['instalments'] <= 60
+    assert outcome(100000, interest_rate, 10, solution['overpayment'], kind, month)[0] <= 60
+    assert outcome(100000, interest_rate, 10, solution['overpayment'] - 0.01, kind, month)[0] > 60
+
+
+def test_zero_rate_has_no_interest_to_save():
+    solution = solve_overpayment(100000, 0, 10, max_interest=0)
+    assert solution['overpayment'] == 0
+    assert solution['total_interest'] == 0
+    assert solution['instalments'] == 120
+
+
+def test_unreachable_goal_and_bad_arguments():
+    assert solve_overpayment(100000, 3.4, 10, target_month=0) is None
+    with pytest.raises(ValueError):
+        solve_overpayment(100000, 3.4, 10)
+    with pytest.raises(ValueError):
+        solve_overpayment(100000, 3.4, 10, target_month=60, kind='weekly')
+
+
+@pytest.mark.parametrize('frequency, accrual', [('fortnightly', 'periodic'), ('weekly', 'daily'), ('daily', 'daily_compound')])
+@pytest.mark.parametrize('interest_rate', [0, 3.4])
+def test_goals_are_counted_in_instalments_of_the_convention(frequency, accrual, interest_rate):
+    convention = payment_convention(frequency, accrual)
+    target = convention.instalments(10)//2
+    solution = solve_overpayment(100000, interest_rate, 10, target_month=target, convention=convention)
+    assert solution['instalments'] <= target
+    assert outcome(100000, interest_rate, 10, solution['overpayment'], 'monthly', 1, convention)[:2] == (solution['instalments'], solution['total_paid'])
+    assert outcome(100000, interest_rate, 10, solution['overpayment'] - 0.01, 'monthly', 1, convention)[0] > target
+    assert solution['overpayment'] < solve_overpayment(100000, interest_rate, 10, target_month=60)['overpayment']
@@ -0,0 +1,53 @@
+## This file contains the tests of the scenario sweep against single-loan summaries
+
+import pytest
+
+from conventions import MONTHLY
+from engine import summarise
+from schedules import RecurringRepayments
+from sweep import sweep
+
+RATES, PERIODS, OVERPAYMENTS = (0, 2.5, 3.4, 6.0), (10, 25), (0, 100.0, 750.0)
+
+
+def single(mortgage_amount, interest_rate, mortgage_period, overpayment):
+    payment = MONTHLY.payment(mortgage_amount, interest_rate, mortgage_period)
+    repayments_mop = RecurringRepayments([1], [mortgage_period*12], [payment + overpayment]) if overpayment > 0 else {}
+    return payment, summarise(mortgage_amount, interest_rate, mortgage_period, mortgage_period*12, {}, repayments_mop)
+
+
+@pytest.fixture(scope='module')
+def table():
+    return sweep(250000, RATES, PERIODS, OVERPAYMENTS, workers=1, chunk_size=5)
+
+
+def test_cells_follow_the_grid_order(table):
+    assert len(table) == len(RATES)*len(PERIODS)*len(OVERPAYMENTS)
+    expected = [(rate, period, overpayment) for rate in RATES for period in PERIODS for overpayment in OVERPAYMENTS]
+    assert list(zip(table['Interest rate'], table['Mortgage period'], table['Overpayment'])) == expected
+
+
+def test_cells_match_summarise(table):
+    for _, cell in table.iterrows():
+        rate, period, overpayment = cell['Interest rate'], int(cell['Mortgage period']), cell['Overpayment']
+        payment, (instalment, payment_to_date, interest) = single(250000, rate, period, overpayment)
+        _, (base_instalment, _, base_interest) = single(250000, rate, period, 0)
+        assert cell['Monthly payment'] == payment
+        assert cell['Instalments'] == instalment
+        assert cell['Total paid'] == pytest.approx(payment_to_date, abs=1e-6)
+        assert cell['Total interest'] == pytest.approx(interest, abs=1e-6)
+        assert cell['Months saved'] == base_instalment - instalment
+        assert cell['Interest saved'] == pytest.approx(base_interest - interest, abs=1e-6)
+        if overpayment == 0:
+            assert cell['Months saved'] == 0 and cell['Interest saved'] == 0
+
+
+def test_overpaying_more_saves_more(table):
+    for (rate, period), cells in table.groupby(['Interest rate', 'Mortgage period']):
+        assert cells['Months saved'].is_monotonic_increasing
+        assert cells['Interest saved'].is_monotonic_increasing
+        assert cells['Months saved'].iloc[-1] > 0
+
+
+def test_workers_give_the_same_table(table):
+    assert sweep(250000, RATES, PERIODS, OVERPAYMENTS, workers=2, chunk_size=5).equals(table)